@@ -2,4 +2,6 @@ RETRIEVE = "retrieve"
 GRADE_DOCUMENTS = "grade_documents"
 GENERATE = "generate"
 WEBSEARCH = "websearch"
-TRANSFORM_QUERY = "transform_query"
\ No newline at end of file
+TRANSFORM_QUERY = "transform_query"
+ROUTE_QUESTION = "route_question"
+FALLBACK = "fallback"
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import time
 
 from dotenv import load_dotenv
 from langgraph.graph import END, StateGraph
@@ -6,12 +7,20 @@ from langgraph.graph import END, StateGraph
 from chat_service.chains.answer_grader import answer_grader
 from chat_service.chains.hallucination_grader import hallucination_grader
 from chat_service.chains.router import question_router, RouteQuery
-from chat_service.consts import GENERATE, GRADE_DOCUMENTS, RETRIEVE, WEBSEARCH
-from chat_service.nodes import generate, grade_documents, retrieve, web_search
+from chat_service.consts import FALLBACK, GENERATE, GRADE_DOCUMENTS, RETRIEVE, ROUTE_QUESTION, WEBSEARCH
+from chat_service.nodes import fallback, generate, grade_documents, retrieve, speculative_route, web_search
 from chat_service.state import GraphState
 
 load_dotenv()
 
+# Start retrieval while the router decides, and drop it if the question goes to web search
+CHAT_SPECULATIVE_RETRIEVAL = os.getenv("CHAT_SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+
+# Retry budget of one chat: generation attempts, estimated tokens and seconds since it started (0 = no limit)
+CHAT_MAX_GENERATIONS = int(os.getenv("CHAT_MAX_GENERATIONS", "3"))
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "0"))
+CHAT_TIME_BUDGET_SECONDS = float(os.getenv("CHAT_TIME_BUDGET_SECONDS", "60"))
+
 
 def decide_to_generate(state):
     print("---ASSESS GRADED DOCUMENTS---")
@@ -26,35 +35,49 @@ def decide_to_generate(state):
         return GENERATE
 
 
-def grade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
+def retry_budget_exhausted(state: GraphState) -> bool:
+    if CHAT_MAX_GENERATIONS and (state.get("iterations") or 0) >= CHAT_MAX_GENERATIONS:
+        print("---DECISION: MAXIMUM GENERATIONS REACHED---")
+        return True
+    if CHAT_TOKEN_BUDGET and (state.get("tokens_used") or 0) >= CHAT_TOKEN_BUDGET:
+        print("---DECISION: TOKEN BUDGET SPENT---")
+        return True
+    started_at = state.get("started_at")
+    if CHAT_TIME_BUDGET_SECONDS and started_at is not None and time.monotonic() - started_at >= CHAT_TIME_BUDGET_SECONDS:
+        print("---DECISION: TIME BUDGET SPENT---")
+        return True
+    return False
+
+
+async def grade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
     print("---CHECK HALLUCINATIONS---")
     question = state["question"]
     documents = state["documents"]
     generation = state["generation"]
 
-    score = hallucination_grader.invoke(
+    score = await hallucination_grader.ainvoke(
         {"documents": documents, "generation": generation}
     )
 
     if hallucination_grade := score.binary_score:
         print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
         print("---GRADE GENERATION vs QUESTION---")
-        score = answer_grader.invoke({"question": question, "generation": generation})
+        score = await answer_grader.ainvoke({"question": question, "generation": generation})
         if answer_grade := score.binary_score:
             print("---DECISION: GENERATION ADDRESSES QUESTION---")
             return "useful"
         else:
             print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
-            return "not useful"
+            return "exhausted" if retry_budget_exhausted(state) else "not useful"
     else:
         print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
-        return "not supported"
+        return "exhausted" if retry_budget_exhausted(state) else "not supported"
 
 
-def route_question(state: GraphState) -> str:
+async def route_question(state: GraphState) -> str:
     print("---ROUTE QUESTION---")
     question = state["question"]
-    source: RouteQuery = question_router.invoke({"question": question})
+    source: RouteQuery = await question_router.ainvoke({"question": question})
     if source.datasource == WEBSEARCH:
         print("---ROUTE QUESTION TO WEB SEARCH---")
         return WEBSEARCH
@@ -62,23 +85,42 @@ def route_question(state: GraphState) -> str:
         print("---ROUTE QUESTION TO RAG---")
         return RETRIEVE
 
+
+def decide_route(state: GraphState) -> str:
+    # Set by the speculative_route node, which has retrieved the documents already
+    return state["datasource"]
+
 # Define a new graph
 workflow = StateGraph(GraphState)
-workflow.add_node(RETRIEVE, retrieve)
 workflow.add_node(GRADE_DOCUMENTS, grade_documents)
 workflow.add_node(GENERATE, generate)
 workflow.add_node(WEBSEARCH, web_search)
-
-#  Define a conditional entry point for graph flow
-workflow.set_conditional_entry_point(
-    route_question,
-    {
-        WEBSEARCH: WEBSEARCH,
-        RETRIEVE: RETRIEVE,
-    },
-)
-# Add an edge and connect RETRIEVE to GRADE_DOCUMENTS
-workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
+workflow.add_node(FALLBACK, fallback)
+
+if CHAT_SPECULATIVE_RETRIEVAL:
+    # Route and retrieve in one node, then grade the documents it already has
+    workflow.add_node(ROUTE_QUESTION, speculative_route)
+    workflow.set_entry_point(ROUTE_QUESTION)
+    workflow.add_conditional_edges(
+        ROUTE_QUESTION,
+        decide_route,
+        {
+            WEBSEARCH: WEBSEARCH,
+            RETRIEVE: GRADE_DOCUMENTS,
+        },
+    )
+else:
+    workflow.add_node(RETRIEVE, retrieve)
+    #  Define a conditional entry point for graph flow
+    workflow.set_conditional_entry_point(
+        route_question,
+        {
+            WEBSEARCH: WEBSEARCH,
+            RETRIEVE: RETRIEVE,
+        },
+    )
+    # Add an edge and connect RETRIEVE to GRADE_DOCUMENTS
+    workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
 
 # Add a conditional edge. Conditional flows are dotted lines in graph image
 workflow.add_conditional_edges(
@@ -103,9 +145,13 @@ workflow.add_conditional_edges(
         "not supported": GENERATE, # probably better to summerise or rephrase
         "useful": END,
         "not useful": WEBSEARCH,
+        "exhausted": FALLBACK,
     },
 )
 
+# The fallback answer ends the chat
+workflow.add_edge(FALLBACK, END)
+
 
 graph = workflow.compile()
 
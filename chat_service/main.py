@@ -1,4 +1,7 @@
 import os
+import time
+from typing import Literal, Optional
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.responses import StreamingResponse, HTMLResponse
 from pathlib import Path
@@ -6,14 +9,25 @@ from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from chat_service import graph
+from chat_service.nodes.retrieve import close_client
+from chat_service.utils.streamUtil import answer_events, sse
 from langchain_core.messages import HumanMessage
 import uvicorn
 
 load_dotenv()
 
 BRAND_NAME = os.getenv("BRAND_NAME", "AI Platform")
+# How sse streams handle answers the graph may still reject: buffered or speculative
+CHAT_STREAM_MODE = os.getenv("CHAT_STREAM_MODE", "buffered")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Pooled connections to the retrieval service
+    await close_client()
 
 app = FastAPI(
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redocs",
     title="Chat Service API",
@@ -33,54 +47,50 @@ app.add_middleware(
 # Define input model
 class ChatRequest(BaseModel):
     question: str
+    # false waits for the graph and returns the answer with its retry accounting as JSON
+    stream: bool = True
+    # "sse" sends status, token, retract, sources and done events instead of plain answer text
+    format: Literal["text", "sse"] = "text"
+    # sse only, defaults to CHAT_STREAM_MODE
+    stream_mode: Optional[Literal["buffered", "speculative"]] = None
 
-async def generate_response(inputs):
-    metadata_set = set()
+async def generate_response(inputs, format="text", mode="buffered"):
+    # Plain text streams the answer as it is generated; it has no way to take a rejected draft back
+    events = answer_events(graph.graph.astream_events(inputs, version="v1"), "speculative" if format == "text" else mode)
     try:
-        async for event in graph.graph.astream_events(inputs, version="v1"):
-            kind = event["event"]
-
-            # Debug print to inspect event structure
-            # print(f"Event data: {event}")
-
-            if kind == "on_chat_model_stream":
-                content = event["data"]["chunk"].content
-                if content:
-                    yield content
-            
-        #     if kind == "on_retriever_end" or kind == "on_chain_end":
-        #         # Debug print to inspect the output data structure
-        #         output_data = event["data"]["output"]
-        #         # print(f"Output data: {output_data}")
-                
-        #         if isinstance(output_data, dict) and "documents" in output_data:
-        #             documents = output_data["documents"]
-        #             for doc in documents:
-        #                 metadata = tuple(doc.metadata.items())  # Convert metadata to a hashable type (tuple of items)
-        #                 metadata_set.add(metadata)
-        #         #         yield f"Metadata: {dict(metadata)}\n\n"
-        #         # else:
-        #         #     print(f"No documents found in output data: {output_data}")
-
-        # # Once streaming is complete, yield the unique metadata information at the end
-        # if metadata_set:
-        #     yield "\n\n"
-        #     yield "Document References:\n"
-        #     for metadata in metadata_set:
-        #         yield f"{dict(metadata)}\n"
-
-    except AttributeError as e:
-        raise HTTPException(status_code=500, detail=f"Attribute error: {str(e)}")
+        async for event, data in events:
+            if format == "sse":
+                yield sse(event, data)
+            elif event == "token":
+                yield data["text"]
     except Exception as e:
+        if format == "sse":
+            # Headers are already sent, so the error travels as an event
+            yield sse("error", {"detail": str(e)})
+            return
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat", response_model=None)
 async def chat_endpoint(chat_request: ChatRequest = Body(...)):
     inputs = {
         "messages": [HumanMessage(content=chat_request.question)],  # Ensure proper initialization
-        "question": chat_request.question
+        "question": chat_request.question,
+        # Start of the retry time budget
+        "started_at": time.monotonic()
     }
-    return StreamingResponse(generate_response(inputs), media_type="text/event-stream")
+    if not chat_request.stream:
+        try:
+            state = await graph.graph.ainvoke(inputs)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {
+            "answer": state["generation"],
+            "iterations": state.get("iterations") or 0,
+            "tokens_used": state.get("tokens_used") or 0,
+            "budget_exhausted": bool(state.get("budget_exhausted")),
+        }
+    mode = chat_request.stream_mode or CHAT_STREAM_MODE
+    return StreamingResponse(generate_response(inputs, chat_request.format, mode), media_type="text/event-stream")
 
 @app.get("/", response_class=HTMLResponse)
 async def get():
@@ -1,6 +1,8 @@
+from chat_service.nodes.fallback import fallback
 from chat_service.nodes.generate import generate
 from chat_service.nodes.grade_documents import grade_documents
 from chat_service.nodes.retrieve import retrieve
+from chat_service.nodes.speculative_route import speculative_route
 from chat_service.nodes.web_search import web_search
 
-__all__ = ["generate", "grade_documents", "retrieve", "web_search"]
\ No newline at end of file
+__all__ = ["fallback", "generate", "grade_documents", "retrieve", "speculative_route", "web_search"]
\ No newline at end of file
@@ -0,0 +1,28 @@
+import os
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from chat_service.state import GraphState
+
+load_dotenv()
+
+CHAT_FALLBACK_ANSWER = (
+    os.getenv("CHAT_FALLBACK_ANSWER")
+    or "Sorry, I could not find a well-supported answer to that question. Please try rephrasing it."
+)
+
+
+async def fallback(state: GraphState) -> Dict[str, Any]:
+    """
+    Ends a chat whose retry budget ran out before a generation passed grading.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): The fallback answer in place of the rejected generation
+    """
+
+    print("---RETRY BUDGET EXHAUSTED, FALLBACK ANSWER---")
+    return {"generation": CHAT_FALLBACK_ANSWER, "budget_exhausted": True}
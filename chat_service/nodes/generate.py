@@ -1,13 +1,33 @@
+import time
 from typing import Any, Dict
 
 from chat_service.chains.generation import generation_chain
+from chat_service.consts import GENERATE
 from chat_service.state import GraphState
 
 
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English text with OpenAI tokenizers
+    return len(text) // 4 + 1
+
+
 async def generate(state: GraphState) -> Dict[str, Any]:
     print("---GENERATE---")
     question = state["question"]
     documents = state["documents"]
 
-    generation = generation_chain.invoke({"context": documents, "question": question})
-    return {"documents": documents, "question": question, "generation": generation}
\ No newline at end of file
+    # The tag marks the answer tokens among the chat model events the chat stream sees
+    generation = await generation_chain.ainvoke(
+        {"context": documents, "question": question}, config={"tags": [GENERATE]}
+    )
+
+    # Retry accounting, checked by the graph before it loops back for another attempt
+    tokens = estimate_tokens(f"{documents}{question}") + estimate_tokens(generation)
+    return {
+        "documents": documents,
+        "question": question,
+        "generation": generation,
+        "iterations": (state.get("iterations") or 0) + 1,
+        "tokens_used": (state.get("tokens_used") or 0) + tokens,
+        "started_at": state.get("started_at") or time.monotonic(),
+    }
\ No newline at end of file
@@ -1,7 +1,54 @@
-from typing import Any, Dict
+import os
+import asyncio
+from typing import Any, Dict, List
 
 from chat_service.chains.retrieval_grader import retrieval_grader
 from chat_service.state import GraphState
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Reranked documents are kept when their relevance_score reaches this, without an LLM call; empty grades every document
+CHAT_RERANK_MIN_SCORE = os.getenv("CHAT_RERANK_MIN_SCORE", "")
+# Grader calls in flight at once
+CHAT_GRADE_CONCURRENCY = int(os.getenv("CHAT_GRADE_CONCURRENCY", "4"))
+# Stop grading and generate once this many documents are relevant; 0 grades every document
+CHAT_GRADE_EARLY_EXIT = int(os.getenv("CHAT_GRADE_EARLY_EXIT", "0"))
+
+
+async def grade_concurrently(question: str, documents: List) -> List[bool]:
+    """
+    Grades documents with concurrent LLM calls and returns one relevance flag per document.
+    In early-exit mode, grading stops once CHAT_GRADE_EARLY_EXIT documents are relevant;
+    documents not graded by then count as not relevant.
+    """
+    inputs = [{"question": question, "document": d.page_content} for d in documents]
+    if not CHAT_GRADE_EARLY_EXIT:
+        scores = await retrieval_grader.abatch(inputs, config={"max_concurrency": CHAT_GRADE_CONCURRENCY})
+        return [score.binary_score.lower() == "yes" for score in scores]
+
+    semaphore = asyncio.Semaphore(CHAT_GRADE_CONCURRENCY)
+
+    async def grade(i):
+        async with semaphore:
+            return i, await retrieval_grader.ainvoke(inputs[i])
+
+    tasks = [asyncio.create_task(grade(i)) for i in range(len(inputs))]
+    relevant = [False] * len(inputs)
+    try:
+        for next_graded in asyncio.as_completed(tasks):
+            i, score = await next_graded
+            relevant[i] = score.binary_score.lower() == "yes"
+            if sum(relevant) >= CHAT_GRADE_EARLY_EXIT:
+                print("---GRADE: ENOUGH RELEVANT DOCUMENTS, SKIPPING THE REST---")
+                break
+    finally:
+        # Pending grader calls are cancelled and awaited, so none outlives the node
+        # and failures among them are retrieved instead of logged as never retrieved
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return relevant
 
 
 async def grade_documents(state: GraphState) -> Dict[str, Any]:
@@ -19,21 +66,22 @@ async def grade_documents(state: GraphState) -> Dict[str, Any]:
     print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
     question = state["question"]
     documents = state["documents"]
+
+    if CHAT_RERANK_MIN_SCORE and documents and all("relevance_score" in d.metadata for d in documents):
+        print("---GRADE: USING RERANK SCORES---")
+        filtered_docs = [d for d in documents if d.metadata["relevance_score"] >= float(CHAT_RERANK_MIN_SCORE)]
+        return {"documents": filtered_docs, "question": question, "web_search": not filtered_docs}
     
     filtered_docs = []
     web_search = True # Assume we have no relevant documents and need to run web search
-    
-    for d in documents:
-        score = retrieval_grader.invoke(
-            {"question": question, "document": d.page_content}
-        )
-        grade = score.binary_score
-        if grade.lower() == "yes":
+
+    relevant = await grade_concurrently(question, documents)
+    for d, is_relevant in zip(documents, relevant):
+        if is_relevant:
             print("---GRADE: DOCUMENT RELEVANT---")
             filtered_docs.append(d)
             web_search = False # We have a relevant document, no need to run web search
         else:
-            print("---GRADE: DOCUMENT NOT RELEVANT---")            
-            continue
+            print("---GRADE: DOCUMENT NOT RELEVANT---")
 
     return {"documents": filtered_docs, "question": question, "web_search": web_search}
\ No newline at end of file
@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import httpx
 from chat_service.state import GraphState
@@ -10,18 +10,42 @@ load_dotenv()
 
 
 RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "http://retrieval_service:8003").rstrip("/")
+# Reranker the retrieval service applies, "lexical" or "cross_encoder"; empty leaves it to the service
+CHAT_RETRIEVAL_RERANKER = os.getenv("CHAT_RETRIEVAL_RERANKER", "")
+CHAT_RETRIEVAL_MAX_CONNECTIONS = int(os.getenv("CHAT_RETRIEVAL_MAX_CONNECTIONS", "100"))
+
+# Shared by every chat, so concurrent requests reuse pooled connections to the retrieval service
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=CHAT_RETRIEVAL_MAX_CONNECTIONS)
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 async def query_retriever(query: str):
     payload = {"query": query}
+    if CHAT_RETRIEVAL_RERANKER:
+        payload["rerank"] = CHAT_RETRIEVAL_RERANKER
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{RETRIEVAL_SERVICE_URL}/retrieve",
-                json=payload,
-            )
-            response.raise_for_status()
+        response = await get_client().post(
+            f"{RETRIEVAL_SERVICE_URL}/retrieve",
+            json=payload,
+        )
+        response.raise_for_status()
     except httpx.HTTPError as exc:
         raise RuntimeError(f"Retrieval service error: {exc}") from exc
 
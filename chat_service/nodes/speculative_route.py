@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Dict
+
+from chat_service.chains.router import question_router, RouteQuery
+from chat_service.consts import RETRIEVE, WEBSEARCH
+from chat_service.nodes.retrieve import retrieve
+from chat_service.state import GraphState
+
+
+async def speculative_route(state: GraphState) -> Dict[str, Any]:
+    """
+    Routes the question while the retrieval for it is already running.
+
+    Most questions go to the vectorstore, so retrieval starts alongside the
+    router call instead of after it. Its documents are kept when the router
+    picks the vectorstore and thrown away when it picks web search.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        state (dict): The chosen datasource, plus the retrieved documents when it is the vectorstore
+    """
+
+    print("---ROUTE QUESTION (SPECULATIVE RETRIEVE)---")
+    question = state["question"]
+
+    retrieval = asyncio.create_task(retrieve(state))
+    # A discarded retrieval may fail after nobody waits for it any more
+    retrieval.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        source: RouteQuery = await question_router.ainvoke({"question": question})
+    except BaseException:
+        retrieval.cancel()
+        raise
+
+    if source.datasource == "vectorstore":
+        print("---ROUTE QUESTION TO RAG---")
+        return {**await retrieval, "datasource": RETRIEVE}
+
+    print("---ROUTE QUESTION TO WEB SEARCH, DISCARDING RETRIEVAL---")
+    retrieval.cancel()
+    return {"question": question, "datasource": WEBSEARCH}
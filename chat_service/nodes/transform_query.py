@@ -19,5 +19,5 @@ async def transform_query(state: GraphState) -> Dict[str, Any]:
     documents = state["documents"]
 
     # Re-write question
-    better_question = question_rewriter.invoke({"question": question})
+    better_question = await question_rewriter.ainvoke({"question": question})
     return {"documents": documents, "question": better_question}
\ No newline at end of file
@@ -34,7 +34,7 @@ async def web_search(state: GraphState) -> Dict[str, Any]:
         logger.info("Skipping web search; tool is not configured.")
         return {"documents": documents or [], "question": question}
 
-    docs = web_search_tool.invoke({"query": question})
+    docs = await web_search_tool.ainvoke({"query": question})
     web_results = "\n".join([d["content"] for d in docs])
     web_results = Document(page_content=web_results)
     if documents is not None:
@@ -10,9 +10,19 @@ class GraphState(TypedDict):
         generation: LLM generation
         web_search: whether to add search
         documents: list of documents
+        datasource: where the speculative router sent the question
+        iterations: generations attempted so far
+        tokens_used: estimated prompt and completion tokens of those generations
+        started_at: monotonic time the chat started
+        budget_exhausted: whether the chat ended on the fallback answer
     """
 
     question: str
     generation: str
     web_search: bool
-    documents: List[str]
\ No newline at end of file
+    documents: List[str]
+    datasource: str
+    iterations: int
+    tokens_used: int
+    started_at: float
+    budget_exhausted: bool
\ No newline at end of file
@@ -0,0 +1,89 @@
+import json
+
+from chat_service.consts import (
+    FALLBACK,
+    GENERATE,
+    GRADE_DOCUMENTS,
+    RETRIEVE,
+    ROUTE_QUESTION,
+    TRANSFORM_QUERY,
+    WEBSEARCH,
+)
+
+STREAM_MODES = ("buffered", "speculative")
+NODES = (ROUTE_QUESTION, RETRIEVE, GRADE_DOCUMENTS, WEBSEARCH, GENERATE, TRANSFORM_QUERY, FALLBACK)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sources(documents):
+    # Unique metadata of the documents the answer was generated from, in order
+    seen = {}
+    for doc in documents or []:
+        if doc.metadata:
+            seen.setdefault(json.dumps(doc.metadata, sort_keys=True, default=str), doc.metadata)
+    return list(seen.values())
+
+
+async def answer_events(events, mode="buffered"):
+    """
+    Turns graph astream_events (v1) into (event, data) pairs for the chat stream.
+
+        status   {"node", "attempt"}    a graph node started
+        token    {"text", "attempt"}    answer text; attempt is null for the fallback answer
+        retract  {"attempt"}            speculative only: drop the text of that attempt
+        sources  [metadata, ...]        the documents behind the final answer
+        done     {"iterations", "tokens_used", "budget_exhausted"}
+
+    Only chat model output tagged with the generate node counts as answer text,
+    so grader and rewriter calls never reach the client. "buffered" sends the
+    answer once the graph has accepted it; "speculative" streams each attempt
+    as it is generated and retracts it when the graph rejects it.
+    """
+    if mode not in STREAM_MODES:
+        raise ValueError(f"Unsupported stream mode: {mode}")
+
+    state = {}
+    attempt = 0
+    # Speculative only: whether the current attempt's text reached the client
+    streamed = False
+
+    async for event in events:
+        kind = event["event"]
+        name = event["name"]
+
+        if kind == "on_chain_start" and name in NODES:
+            if name in (GENERATE, FALLBACK) and streamed:
+                yield "retract", {"attempt": attempt}
+                streamed = False
+            if name == GENERATE:
+                attempt += 1
+            yield "status", {"node": name, "attempt": attempt}
+
+        elif kind == "on_chat_model_stream" and GENERATE in event.get("tags", []):
+            content = event["data"]["chunk"].content
+            if content and mode == "speculative":
+                yield "token", {"text": content, "attempt": attempt}
+                streamed = True
+
+        elif kind == "on_chain_end" and name in NODES:
+            output = event["data"].get("output")
+            if isinstance(output, dict):
+                state.update(output)
+            # A generation chain that does not stream still shows its attempt
+            if name == GENERATE and mode == "speculative" and not streamed and state.get("generation"):
+                yield "token", {"text": state["generation"], "attempt": attempt}
+                streamed = True
+
+    if state.get("budget_exhausted"):
+        yield "token", {"text": state["generation"], "attempt": None}
+    elif mode == "buffered" and state.get("generation"):
+        yield "token", {"text": state["generation"], "attempt": attempt}
+    yield "sources", sources(state.get("documents"))
+    yield "done", {
+        "iterations": state.get("iterations") or 0,
+        "tokens_used": state.get("tokens_used") or 0,
+        "budget_exhausted": bool(state.get("budget_exhausted")),
+    }
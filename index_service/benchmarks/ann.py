@@ -0,0 +1,104 @@
+"""
+Recall vs latency of the pgvector ANN index on a local PGVector database.
+
+Samples stored embeddings of a collection as queries, takes their exact top-k
+with index scans disabled, then repeats every query at each ef_search (HNSW)
+or probes (IVFFlat) setting and reports recall@k and query latency:
+
+    python -m index_service.benchmarks.ann --collection vector --queries 200 --k 10 \
+        --ef-search 10 20 40 80 160 --probes 1 5 10 20
+
+Build the index first (POST /admin/ann_index). Only the settings of the index
+methods that exist are measured. The connection string defaults to VECTORDB_URL.
+"""
+import os
+import time
+import argparse
+import statistics
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from index_service.utils.annIndexUtil import EMBEDDING_TABLE, ANNIndexManager
+
+SEARCH = text(
+    f"SELECT id FROM {EMBEDDING_TABLE} WHERE collection_id = :collection_id "
+    "ORDER BY embedding <=> CAST(:vector AS vector) LIMIT :k"
+)
+
+
+def sample_queries(conn, collection_id, count):
+    rows = conn.execute(text(
+        f"SELECT embedding::text FROM {EMBEDDING_TABLE} WHERE collection_id = :collection_id ORDER BY random() LIMIT :count"
+    ), {"collection_id": collection_id, "count": count})
+    return [row[0] for row in rows]
+
+
+def run(engine, collection_id, queries, k, settings):
+    # Every query in its own transaction, so SET LOCAL applies to it alone
+    results = []
+    latencies = []
+    for vector in queries:
+        with engine.begin() as conn:
+            for name, value in settings.items():
+                conn.exec_driver_sql(f"SET LOCAL {name} = {value}")
+            start = time.perf_counter()
+            ids = conn.execute(SEARCH, {"collection_id": collection_id, "vector": vector, "k": k}).scalars().all()
+            latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    return results, latencies
+
+
+def report(label, results, exact, latencies, k):
+    recall = statistics.mean(len(set(found) & set(truth)) / min(k, len(truth) or 1) for found, truth in zip(results, exact))
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(f"{label:<22} {recall:>9.3f} {statistics.median(latencies):>9.2f} {p95:>9.2f}")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Measure recall@k and latency of the pgvector ANN index.")
+    parser.add_argument("--db-url", default=os.getenv("VECTORDB_URL"))
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20])
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    with engine.connect() as conn:
+        collection_id = conn.execute(
+            text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"), {"name": args.collection}
+        ).scalar()
+        if collection_id is None:
+            raise SystemExit(f"Collection {args.collection} not found")
+        queries = sample_queries(conn, collection_id, args.queries)
+    if not queries:
+        raise SystemExit(f"Collection {args.collection} is empty")
+
+    indexes = {entry["index"] for entry in ANNIndexManager(args.db_url).status() if entry["valid"]}
+
+    print(f"{len(queries)} queries, k={args.k}, indexes: {', '.join(sorted(indexes)) or 'none'}")
+    print(f"{'setting':<22} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+
+    exact, latencies = run(engine, collection_id, queries, args.k, {"enable_indexscan": "off"})
+    report("exact", exact, exact, latencies, args.k)
+
+    sweeps = []
+    if ANNIndexManager.index_name("hnsw") in indexes:
+        sweeps += [("hnsw.ef_search", value) for value in args.ef_search]
+    if ANNIndexManager.index_name("ivfflat") in indexes:
+        sweeps += [("ivfflat.probes", value) for value in args.probes]
+
+    if sweeps and len(indexes) > 1:
+        print("Both an HNSW and an IVFFlat index exist and the planner picks one of them; drop one to compare methods.")
+
+    for name, value in sweeps:
+        results, latencies = run(engine, collection_id, queries, args.k, {name: value})
+        report(f"{name}={value}", results, exact, latencies, args.k)
+
+
+if __name__ == "__main__":
+    main()
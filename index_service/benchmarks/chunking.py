@@ -0,0 +1,158 @@
+"""
+Offline benchmark for the index service chunking strategies.
+
+Parses every PDF in a local folder once, then for each strategy reports the
+chunking throughput, chunk count and size distribution, and the retrieval
+hit-rate at k against a small labelled question set:
+
+    python -m index_service.benchmarks.chunking docs/ --questions questions.json --k 3
+
+questions.json is a list of {"question": ..., "answer": ...} or
+{"question": ..., "source": "SOP-001.pdf", "page": 2} entries. A question is a
+hit when one of its top-k chunks contains the answer text, or else comes from
+the labelled source (and page, when given). Retrieval is TF-IDF by default so
+the benchmark runs without API keys; --embeddings uses OpenAI embeddings.
+"""
+import os
+import re
+import json
+import math
+import time
+import argparse
+import statistics
+from collections import Counter
+
+from index_service.services.chunking import CHUNKING_STRATEGIES, get_text_splitter
+from index_service.services.pipeline import parse_pdf
+from index_service.utils.storageLocalUtil import LocalStorage
+
+
+def load_pages(pdf_dir):
+    pages = []
+    for path in LocalStorage(pdf_dir).list_files():
+        pages.extend(parse_pdf(path))
+    return pages
+
+
+def _tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _normalise(text):
+    return " ".join(text.lower().split())
+
+
+class LexicalRetriever:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        counts = [Counter(_tokens(chunk.page_content)) for chunk in chunks]
+        df = Counter(term for count in counts for term in count)
+        self.idf = {term: math.log((1 + len(chunks)) / (1 + n)) + 1 for term, n in df.items()}
+        self.vectors = [self._weigh(count) for count in counts]
+
+    def _weigh(self, count):
+        vector = {term: tf * self.idf.get(term, 0.0) for term, tf in count.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {term: w / norm for term, w in vector.items()}
+
+    def search(self, query, k):
+        q = self._weigh(Counter(_tokens(query)))
+        scores = [sum(w * vector.get(term, 0.0) for term, w in q.items()) for vector in self.vectors]
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        return [self.chunks[i] for i in ranked[:k]]
+
+
+class EmbeddingRetriever:
+    def __init__(self, chunks):
+        import numpy as np
+        from langchain_openai import OpenAIEmbeddings
+
+        self.np = np
+        self.chunks = chunks
+        self.embeddings = OpenAIEmbeddings()
+        matrix = np.array(self.embeddings.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+        self.matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def search(self, query, k):
+        q = self.np.array(self.embeddings.embed_query(query), dtype=self.np.float32)
+        scores = self.matrix @ (q / self.np.linalg.norm(q))
+        return [self.chunks[i] for i in self.np.argsort(-scores)[:k]]
+
+
+def is_hit(question, chunk):
+    if question.get("answer"):
+        return _normalise(question["answer"]) in _normalise(chunk.page_content)
+    if os.path.basename(chunk.metadata.get("source") or "") != os.path.basename(question["source"]):
+        return False
+    return question.get("page") is None or chunk.metadata.get("page") == question["page"]
+
+
+def benchmark(pages, strategy, questions=(), k=3, retriever=LexicalRetriever):
+    splitter = get_text_splitter(strategy)
+    start = time.perf_counter()
+    chunks = splitter.split_documents(pages)
+    elapsed = time.perf_counter() - start
+
+    sizes = sorted(len(chunk.page_content) for chunk in chunks) or [0]
+    report = {
+        "strategy": strategy,
+        "chunks": len(chunks),
+        "chunks_per_second": len(chunks) / elapsed if elapsed else float("inf"),
+        "size_min": sizes[0],
+        "size_p50": statistics.median(sizes),
+        "size_p90": sizes[min(int(len(sizes) * 0.9), len(sizes) - 1)],
+        "size_max": sizes[-1],
+        "hit_rate": None,
+    }
+
+    if questions and chunks:
+        index = retriever(chunks)
+        hits = sum(any(is_hit(q, chunk) for chunk in index.search(q["question"], k)) for q in questions)
+        report["hit_rate"] = hits / len(questions)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index service chunking strategies on a local PDF folder.")
+    parser.add_argument("pdf_dir")
+    parser.add_argument("--questions", help="JSON file with labelled questions")
+    parser.add_argument("--strategies", nargs="+", default=list(CHUNKING_STRATEGIES), choices=CHUNKING_STRATEGIES)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--embeddings", action="store_true", help="Retrieve with OpenAI embeddings instead of TF-IDF")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args()
+
+    questions = []
+    if args.questions:
+        with open(args.questions) as f:
+            questions = json.load(f)
+
+    pages = load_pages(args.pdf_dir)
+    retriever = EmbeddingRetriever if args.embeddings else LexicalRetriever
+
+    reports = []
+    for strategy in args.strategies:
+        try:
+            reports.append(benchmark(pages, strategy, questions, args.k, retriever))
+        except Exception as e:
+            reports.append({"strategy": strategy, "error": str(e)})
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{len(pages)} pages, {len(questions)} questions, k={args.k}")
+    print(f"{'strategy':<10} {'chunks':>7} {'chunks/s':>10} {'min':>6} {'p50':>6} {'p90':>6} {'max':>6} {'hit@k':>6}")
+    for report in reports:
+        if "error" in report:
+            print(f"{report['strategy']:<10} error: {report['error']}")
+            continue
+        hit_rate = "-" if report["hit_rate"] is None else f"{report['hit_rate']:.2f}"
+        print(
+            f"{report['strategy']:<10} {report['chunks']:>7} {report['chunks_per_second']:>10.0f} "
+            f"{report['size_min']:>6} {report['size_p50']:>6.0f} {report['size_p90']:>6} {report['size_max']:>6} {hit_rate:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Literal, Optional
 from index_service.utils.authUtil import verify_token
 from index_service.utils.roleCheckerUtil import RoleChecker
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from index_service.services.indexing import IndexService
+from index_service.services.jobs import JobManager
+from index_service.utils.snapshotUtil import CollectionNotFound
 
 allow_admin = RoleChecker(["admin"])
 
@@ -16,10 +18,110 @@ router = APIRouter(
 class IngestRequest(BaseModel):
     source_directory: str
     storage_type: str
+    incremental: bool = False
+    chunking: Literal["recursive", "token", "page", "section"] = "recursive"
+    # Target collection; a study_id alone indexes tmf/{study_id}/ into collection tmf_{study_id}
+    collection: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,62}$")
+    study_id: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,58}$")
+
+class ANNIndexRequest(BaseModel):
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    # HNSW graph degree and build-time candidate list
+    m: int = Field(16, ge=2, le=100)
+    ef_construction: int = Field(64, ge=4, le=1000)
+    # IVFFlat clusters; sized from the row count when omitted
+    lists: Optional[int] = Field(None, ge=1, le=32768)
+    rebuild: bool = False
+    # Lets the first build fix the unsized embedding column, which rewrites the table under an exclusive lock
+    pin_dimensions: bool = False
+
+class SnapshotRequest(BaseModel):
+    collection: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,62}$")
+    # float16 halves the file and the retrieval pod's memory at a small cost in score precision
+    dtype: Optional[Literal["float32", "float16"]] = None
 
 index = IndexService()
+jobs = JobManager(index)
 
+# Plain def so FastAPI runs the ingest in its threadpool instead of on the event loop
 @router.post("/index_all", status_code=200)
-async def index_all_documents(request: IngestRequest):
-    result = index.all(request.source_directory, request.storage_type)
+def index_all_documents(request: IngestRequest):
+    result = index.all(
+        request.source_directory,
+        request.storage_type,
+        request.incremental,
+        request.chunking,
+        collection=request.collection,
+        study_id=request.study_id
+    )
     return result
+
+@router.get("/embedding_cache", status_code=200)
+async def get_embedding_cache_stats():
+    return index.embedding_cache_stats()
+
+@router.post("/jobs", status_code=202)
+async def submit_index_job(request: IngestRequest):
+    job = jobs.submit(
+        request.source_directory,
+        request.storage_type,
+        request.incremental,
+        request.chunking,
+        request.collection,
+        request.study_id
+    )
+    return job.to_dict()
+
+@router.get("/jobs", status_code=200)
+async def list_index_jobs():
+    return [job.to_dict() for job in jobs.list()]
+
+@router.get("/jobs/{job_id}", status_code=200)
+async def get_index_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@router.post("/jobs/{job_id}/cancel", status_code=200)
+async def cancel_index_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@router.get("/ann_index", status_code=200)
+def get_ann_indexes():
+    return index.ann_index.status()
+
+# Plain def, index builds take minutes on a large collection
+@router.post("/ann_index", status_code=200)
+def create_ann_index(request: ANNIndexRequest):
+    try:
+        return index.ann_index.create(request.method, request.m, request.ef_construction, request.lists, request.rebuild, request.pin_dimensions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/ann_index/{method}", status_code=200)
+def drop_ann_index(method: Literal["hnsw", "ivfflat"]):
+    index.ann_index.drop(method)
+    return {"dropped": index.ann_index.index_name(method)}
+
+# Plain def, the export streams the whole collection to disk
+@router.post("/snapshots", status_code=200)
+def export_snapshot(request: SnapshotRequest):
+    try:
+        return index.export_snapshot(request.collection, request.dtype)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/snapshots", status_code=200)
+def get_snapshot_status(collection: Optional[str] = None):
+    try:
+        return index.snapshot_status(collection)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
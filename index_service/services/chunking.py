@@ -0,0 +1,85 @@
+import re
+from typing import Any, Iterable, List
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter, TokenTextSplitter
+
+CHUNKING_STRATEGIES = ("recursive", "token", "page", "section")
+
+# A short title: at most 60 characters, starting with a capital, with no sentence punctuation at the end
+TITLE = r"(?=[^\n]{1,60}$)[A-Z](?:[^\n]*[^\s.:;,!?])?"
+# Every word capitalised, bar short joining words: "Purpose", "Roles and Responsibilities", "SCOPE"
+TITLE_CASE = r"(?=[^\n]{1,60}$)[A-Z][\w()/&'\-]*(?:[ \t]+(?:[A-Z(][\w()/&'\-]*|a|an|and|as|at|by|for|in|of|on|or|the|to|with|&|-|/))*"
+
+# Dotted numbering ("4.2 Responsibilities"), single numbers before a title-case title ("4. Purpose"),
+# SECTION/APPENDIX/ANNEX titles and short upper-case lines. Numbered list items, table rows
+# ("3 Subjects enrolled") and dates ("12 March 2024") do not start a section.
+SOP_HEADING = re.compile(
+    rf"^[ \t]*(?:\d+(?:\.\d+)+\.?[ \t]+{TITLE}|\d+\.?[ \t]+{TITLE_CASE}|(?:SECTION|APPENDIX|ANNEX)\b[^\n]{{0,60}}|[A-Z][A-Z0-9 /&,\-]{{3,60}})[ \t]*$",
+    re.MULTILINE
+)
+
+
+class PageSplitter:
+    """One chunk per PDF page, as parsed."""
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in documents if doc.page_content.strip()]
+
+
+class SectionSplitter(TextSplitter):
+    """
+    Splits SOP pages at their section headings, so a chunk does not straddle two
+    sections. Sections longer than `chunk_size` are split further with the
+    recursive splitter and every piece keeps its section heading as a prefix.
+    Headings are only recognised within a page, since pages are split one by one.
+    """
+
+    def __init__(self, chunk_size: int = 1024, chunk_overlap: int = 32, **kwargs: Any):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        starts = [match.start() for match in SOP_HEADING.finditer(text)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+
+        chunks = []
+        pending = ""
+        for start, end in zip(starts, starts[1:] + [len(text)]):
+            # A heading with no body of its own (e.g. a document title) is carried into the next section
+            section = f"{pending}\n{text[start:end].strip()}".strip()
+            if not section or "\n" not in section and end != len(text):
+                pending = section
+                continue
+            pending = ""
+
+            if len(section) <= self._chunk_size:
+                chunks.append(section)
+                continue
+
+            heading, _, body = section.partition("\n")
+            if not body:
+                heading, body = "", section
+            prefix = f"{heading}\n" if heading else ""
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=max(self._chunk_size - len(prefix), 1),
+                chunk_overlap=min(self._chunk_overlap, max(self._chunk_size - len(prefix) - 1, 0)),
+                separators=["\n\n", "\n", " ", ""]
+            )
+            chunks.extend(prefix + piece for piece in splitter.split_text(body))
+        return chunks
+
+
+def get_text_splitter(strategy: str = "recursive"):
+    match strategy:
+        case 'recursive':
+            return RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=32, separators=["\n\n", "\n", " ", ""])
+        case 'token':
+            # Same encoding as the OpenAI embedding models
+            return TokenTextSplitter(encoding_name="cl100k_base", chunk_size=256, chunk_overlap=16)
+        case 'page':
+            return PageSplitter()
+        case 'section':
+            return SectionSplitter(chunk_size=1024, chunk_overlap=32)
+        case _:
+            raise ValueError(f"Unsupported chunking strategy: {strategy}")
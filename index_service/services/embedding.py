@@ -0,0 +1,58 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from index_service.utils.embeddingCacheUtil import content_hash
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStage:
+    """
+    Embeds chunk texts for the write path.
+
+    Texts already in the embedding cache are served from it; the rest are
+    de-duplicated, split into `batch_size` requests and sent to the embedding
+    model `concurrency` requests at a time, then written back to the cache.
+    """
+
+    def __init__(self, embeddings, cache=None, batch_size=100, concurrency=4):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def embed(self, texts: List[str], stats: dict = None) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        vectors = self.cache.mget(self.model, list(set(hashes))) if self.cache is not None else {}
+
+        # Each distinct missing text is embedded once, however often it repeats
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            keys = list(missing)
+            batches = [keys[i:i+self.batch_size] for i in range(0, len(keys), self.batch_size)]
+            results = self.executor.map(lambda batch: self.embeddings.embed_documents([missing[key] for key in batch]), batches)
+            embedded = {}
+            for batch, batch_vectors in zip(batches, results):
+                embedded.update(zip(batch, batch_vectors))
+            if self.cache is not None:
+                self.cache.mset(self.model, embedded)
+            vectors.update(embedded)
+
+        hits = sum(1 for key in hashes if key not in missing)
+        misses = len(hashes) - hits
+        if self.cache is not None:
+            self.cache.record(hits, misses)
+        if stats is not None:
+            stats["embedding_cache_hits"] = stats.get("embedding_cache_hits", 0) + hits
+            stats["embedding_cache_misses"] = stats.get("embedding_cache_misses", 0) + misses
+
+        return [vectors[key] for key in hashes]
@@ -1,9 +1,11 @@
 import os
 import re
 import logging
+import itertools
+import threading
+from typing import Iterable
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import S3FileLoader
 from langchain.schema import Document
 from langchain.indexes import SQLRecordManager, index
@@ -11,6 +13,16 @@ from langchain_postgres import PGVector
 from index_service.utils.storageLocalUtil import LocalStorage
 from index_service.utils.storageS3Util import S3Storage
 from index_service.utils.dbUtil import create_database_if_not_exists
+from index_service.utils.manifestUtil import IndexManifest, CollectionVersions
+from index_service.utils.embeddingCacheUtil import EmbeddingCache
+from index_service.utils.pgCopyUtil import PGCopyWriter
+from index_service.utils.annIndexUtil import ANNIndexManager
+from index_service.utils.lexicalIndexUtil import LexicalIndex
+from index_service.utils.snapshotUtil import SnapshotExporter
+from index_service.services.pipeline import IngestPipeline, IngestCancelled
+from index_service.services.writer import VectorWriter
+from index_service.services.embedding import EmbeddingStage
+from index_service.services.chunking import get_text_splitter
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +30,21 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Collection names end up in table rows and record manager namespaces, keep them plain
+COLLECTION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]{0,62}")
+
+
+class IndexCollection:
+    """A PGVector collection with the record manager and manifest namespace that track its contents."""
+
+    def __init__(self, name, namespace, record_manager, manifest, vectorstore):
+        self.name = name
+        self.namespace = namespace
+        self.record_manager = record_manager
+        self.manifest = manifest
+        self.vectorstore = vectorstore
+
+
 class IndexService:
     def __init__(self):
         self.S3_SOURCE_BUCKET = os.getenv("S3_SOURCE_BUCKET")
@@ -30,6 +57,29 @@ class IndexService:
         self.DATABASE_URL = os.getenv("DATABASE_URL")
         self.VECTORDB_URL = os.getenv("VECTORDB_URL")
 
+        # Ingest pipeline tuning
+        self.INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "100"))
+        self.INDEX_DOWNLOAD_WORKERS = int(os.getenv("INDEX_DOWNLOAD_WORKERS", "10"))
+        self.INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "1000"))
+        self.INDEX_EMBED_BATCH_SIZE = int(os.getenv("INDEX_EMBED_BATCH_SIZE", "100"))
+        self.INDEX_EMBED_CONCURRENCY = int(os.getenv("INDEX_EMBED_CONCURRENCY", "4"))
+        # "postgres" (vector database), "none", or a SQLAlchemy URL such as sqlite:////data/embedding_cache.db
+        self.INDEX_EMBEDDING_CACHE = os.getenv("INDEX_EMBEDDING_CACHE", "postgres")
+        # "insert" writes through PGVector, "copy" bulk loads each batch with COPY
+        self.INDEX_WRITE_MODE = os.getenv("INDEX_WRITE_MODE", "insert")
+        self.INDEX_PARSE_PROCESSES = int(os.getenv("INDEX_PARSE_PROCESSES") or os.cpu_count() or 1)
+        self.INDEX_S3_IN_MEMORY = os.getenv("INDEX_S3_IN_MEMORY", "false").lower() == "true"
+        self.INDEX_S3_SPOOL_MB = int(os.getenv("INDEX_S3_SPOOL_MB", "16"))
+        # Memory for HNSW / IVFFlat builds, e.g. 1GB; the server default when empty
+        self.INDEX_ANN_MAINTENANCE_WORK_MEM = os.getenv("INDEX_ANN_MAINTENANCE_WORK_MEM") or None
+        # Full-text column for hybrid retrieval, kept up to date by Postgres as chunks are written
+        self.INDEX_LEXICAL_INDEX = os.getenv("INDEX_LEXICAL_INDEX", "true").lower() == "true"
+        self.INDEX_FTS_CONFIG = os.getenv("INDEX_FTS_CONFIG", "english")
+        # Collection snapshots for the retrieval service's local backend
+        self.INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "/data/snapshots")
+        self.INDEX_SNAPSHOT_DTYPE = os.getenv("INDEX_SNAPSHOT_DTYPE", "float32")
+        self.INDEX_SNAPSHOT_ON_INDEX = os.getenv("INDEX_SNAPSHOT_ON_INDEX", "false").lower() == "true"
+
         # Get the string segment after the final '/'
         match = re.search(r'[^/]+$', self.VECTORDB_URL) 
         self.VECTORDB_NAME = match.group(0)
@@ -37,57 +87,267 @@ class IndexService:
         # Create the Vector Database
         create_database_if_not_exists(self.DATABASE_URL, self.VECTORDB_NAME )
         
-        # Initialize record manager
-        namespace = f"{self.DOMAIN}/{self.VECTORDB_NAME}"
-        self.record_manager = SQLRecordManager(namespace=namespace, db_url=self.VECTORDB_URL)
-        self.record_manager.create_schema()
-        
-        # Initialize embeddings and vectorstore
+        # Initialize embeddings
         self.embeddings = OpenAIEmbeddings()
-        self.vectorstore = PGVector(
+
+        # Index version per collection, read by the retrieval service's result cache
+        self.collection_versions = CollectionVersions(self.VECTORDB_URL)
+        self.collection_versions.create_schema()
+
+        # Approximate nearest neighbour index on the embedding column
+        self.ann_index = ANNIndexManager(self.VECTORDB_URL, maintenance_work_mem=self.INDEX_ANN_MAINTENANCE_WORK_MEM)
+
+        self.snapshots = SnapshotExporter(self.VECTORDB_URL, self.INDEX_SNAPSHOT_DIR)
+
+        # Collections are opened on first use; the default one is named after the vector database
+        self.collections = {}
+        self.collections_lock = threading.Lock()
+        self.collection()
+
+        # After the default collection, which creates the embedding table
+        if self.INDEX_LEXICAL_INDEX:
+            LexicalIndex(self.VECTORDB_URL, self.INDEX_FTS_CONFIG).ensure()
+
+        # Initialize embedding stage and its persistent cache
+        match self.INDEX_EMBEDDING_CACHE:
+            case 'none':
+                self.embedding_cache = None
+            case 'postgres':
+                self.embedding_cache = EmbeddingCache(self.VECTORDB_URL)
+            case _:
+                self.embedding_cache = EmbeddingCache(self.INDEX_EMBEDDING_CACHE)
+        if self.embedding_cache is not None:
+            self.embedding_cache.create_schema()
+        self.embedder = EmbeddingStage(
+            self.embeddings,
+            self.embedding_cache,
+            batch_size=self.INDEX_EMBED_BATCH_SIZE,
+            concurrency=self.INDEX_EMBED_CONCURRENCY
+        )
+
+    def collection_name(self, name: str = None) -> str:
+        name = name or self.VECTORDB_NAME
+        if not COLLECTION_NAME.fullmatch(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return name
+
+    def collection_namespace(self, name: str) -> str:
+        # The default collection keeps the namespace it was indexed under before collections existed
+        namespace = f"{self.DOMAIN}/{self.VECTORDB_NAME}"
+        if name != self.VECTORDB_NAME:
+            namespace = f"{namespace}/{name}"
+        return namespace
+
+    def collection(self, name: str = None) -> IndexCollection:
+        name = self.collection_name(name)
+        with self.collections_lock:
+            if name not in self.collections:
+                self.collections[name] = self._open_collection(name)
+            return self.collections[name]
+
+    def _open_collection(self, name):
+        namespace = self.collection_namespace(name)
+
+        # Initialize record manager
+        record_manager = SQLRecordManager(namespace=namespace, db_url=self.VECTORDB_URL)
+        record_manager.create_schema()
+
+        # Initialize manifest of indexed file versions
+        manifest = IndexManifest(namespace=namespace, db_url=self.VECTORDB_URL)
+        manifest.create_schema()
+
+        vectorstore = PGVector(
             self.embeddings,
-            collection_name=self.VECTORDB_NAME,
+            collection_name=name,
             connection=self.VECTORDB_URL
         )
+        logger.info(f"Opened collection {name} ({namespace})")
+        return IndexCollection(name, namespace, record_manager, manifest, vectorstore)
+
+    @staticmethod
+    def study_collection_name(study_id: str) -> str:
+        return f"tmf_{study_id}"
+
+    def all(self, source: str, storage_type: str, incremental: bool = False, chunking: str = "recursive", progress: dict = None, cancel_event=None, collection: str = None, study_id: str = None):
+        text_splitter = get_text_splitter(chunking)
+
+        # A study run only reads that study's tmf/{study_id}/ folder and defaults to its own collection
+        prefix = ""
+        if study_id:
+            prefix = f"tmf/{study_id}/"
+            collection = collection or self.study_collection_name(study_id)
+        target = self.collection(collection)
 
-    def all(self, source: str, storage_type: str):    
         match storage_type:
             case 'local':
-                DocumentProcessor = LocalStorage(source)
+                DocumentProcessor = LocalStorage(os.path.join(source, prefix))
             case 's3':
                 DocumentProcessor = S3Storage(
                     source,
                     self.AWS_ACCESS_KEY_ID, 
                     self.AWS_SECRET_ACCESS_KEY, 
-                    self.AWS_DEFAULT_REGION, 
-                    batch_size=100, 
-                    max_workers=10
+                    self.AWS_DEFAULT_REGION,
+                    in_memory=self.INDEX_S3_IN_MEMORY,
+                    spool_threshold=self.INDEX_S3_SPOOL_MB * 1024 * 1024,
+                    prefix=prefix
                 )
             case _:
                 raise ValueError(f"Unsupported storage type: {storage_type}")
 
-        docs = DocumentProcessor.load_documents()
-        result = self.upsert_index(docs)
-        return result
+        known = target.manifest.load()
+        listed = {}
+
+        def is_changed(file):
+            # Re-chunking with another strategy counts as a change too
+            listed[file] = f"{DocumentProcessor.version(file)}/{chunking}"
+            if not incremental:
+                return True
+            return known.get(file, (None, None))[0] != listed[file]
+
+        pipeline = IngestPipeline(
+            DocumentProcessor,
+            text_splitter,
+            queue_size=self.INDEX_QUEUE_SIZE,
+            download_workers=self.INDEX_DOWNLOAD_WORKERS,
+            parse_processes=self.INDEX_PARSE_PROCESSES,
+            file_filter=is_changed,
+            stats=progress,
+            cancel_event=cancel_event
+        )
+        bulk_writer = PGCopyWriter(self.VECTORDB_URL, target.name) if self.INDEX_WRITE_MODE == "copy" else None
+        writer = VectorWriter(target.vectorstore, self.embedder, stats=pipeline.stats, bulk_writer=bulk_writer)
+
+        # Skipped files never reach index(), so an incremental run may only clean up the sources it re-read
+        try:
+            result = self.upsert_index(
+                pipeline,
+                cleanup="incremental" if incremental else "full",
+                writer=writer,
+                keep_sources=lambda: [DocumentProcessor.source_id(file) for file, _ in pipeline.failed],
+                collection=target
+            )
+            logger.info(f"Parsed {pipeline.stats['files_parsed']} files in {pipeline.stats['parse_seconds']:.2f}s of parse time")
+            logger.info(f"Embedding cache: {pipeline.stats.get('embedding_cache_hits', 0)} hits, {pipeline.stats.get('embedding_cache_misses', 0)} misses")
+
+            if not listed or (result is None and not incremental):
+                return None
+
+            if result is None:
+                result = {"num_added": 0, "num_updated": 0, "num_skipped": 0, "num_deleted": 0}
+
+            if cancel_event is not None and cancel_event.is_set():
+                raise IngestCancelled("Ingest cancelled")
+
+            # Files gone from the source since the last run
+            removed = [file for file in known if file not in listed]
+            if incremental and removed:
+                result["num_deleted"] += self._delete_sources(target.record_manager, [known[file][1] for file in removed], writer)
 
-    def upsert_index(self, docs: list):
-        if not docs:
-            logger.error("No documents found.")
+            target.manifest.update({file: (listed[file], DocumentProcessor.source_id(file)) for file in pipeline.completed})
+            target.manifest.delete(removed)
+
+            result["collection"] = target.name
+            result["num_files_skipped"] = pipeline.stats["files_skipped"]
+            result["failed_files"] = [{"file": file, "error": error} for file, error in pipeline.failed]
+            if self.INDEX_SNAPSHOT_ON_INDEX and (pipeline.stats["rows_written"] or pipeline.stats["rows_deleted"]):
+                result["snapshot"] = self.export_snapshot(target.name)
+            return result
+        finally:
+            if bulk_writer is not None:
+                bulk_writer.close()
+            # Lets the retrieval service drop results it cached for this collection
+            if pipeline.stats["rows_written"] or pipeline.stats["rows_deleted"]:
+                self.collection_versions.bump(target.name)
+
+    # Snapshots only read, so they never open the collection: PGVector would create a missing one
+    def export_snapshot(self, collection: str = None, dtype: str = None):
+        name = self.collection_name(collection)
+        return self.snapshots.export(
+            name,
+            self.collection_namespace(name),
+            dtype or self.INDEX_SNAPSHOT_DTYPE,
+            embedding_model=self.embeddings.model
+        )
+
+    def snapshot_status(self, collection: str = None):
+        name = self.collection_name(collection)
+        return self.snapshots.status(name, self.collection_namespace(name))
+
+    def embedding_cache_stats(self):
+        if self.embedding_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.embedding_cache.stats()}
+
+    def upsert_index(self, docs: Iterable[Document], cleanup: str = "full", writer: VectorWriter = None, keep_sources=None, collection: IndexCollection = None):
+        collection = collection or self.collection()
+        record_manager = collection.record_manager
+        docs = iter(docs)
+
+        # Never run a full cleanup against an empty source, it would wipe the collection
+        first = next(docs, None)
+        if first is None:
+            if cleanup == "full":
+                logger.error("No documents found.")
+            else:
+                logger.info("No changed documents to index.")
             return None
 
-        logger.info(f"Loaded {len(docs)} documents.")
+        # Every collection shares the embedding table's id column, and index() derives ids
+        # from content and metadata. The default collection keeps the ids it had before collections existed
+        if collection.name != self.VECTORDB_NAME:
+            first = self._stamp_collection(collection.name, first)
+            docs = (self._stamp_collection(collection.name, doc) for doc in docs)
 
-        # Index documents
+        writer = writer or collection.vectorstore
+        start = record_manager.get_time()
+
+        # Index documents batch by batch as the pipeline produces them. The full cleanup
+        # runs afterwards so that sources which could not be read this time keep their chunks
         result = index(
-            docs,
-            self.record_manager,
-            self.vectorstore,
-            cleanup="full",
+            itertools.chain([first], docs),
+            record_manager,
+            writer,
+            batch_size=self.INDEX_BATCH_SIZE,
+            cleanup=None if cleanup == "full" else cleanup,
             source_id_key="source",
         )
 
+        if cleanup == "full":
+            if keep_sources is not None:
+                self._refresh_sources(record_manager, keep_sources())
+            result["num_deleted"] += self._delete_before(record_manager, start, writer)
+
         logger.info(result)
         return result
 
+    @staticmethod
+    def _stamp_collection(name, doc):
+        doc.metadata["collection"] = name
+        return doc
+
+    def _refresh_sources(self, record_manager, sources):
+        # Mark the existing chunks of these sources as seen in this run
+        for source in sources:
+            uids = record_manager.list_keys(group_ids=[source])
+            if uids:
+                record_manager.update(uids, group_ids=[source] * len(uids))
+
+    def _delete_before(self, record_manager, start, writer):
+        # Same as index(cleanup="full"): drop everything not written or refreshed since `start`
+        num_deleted = 0
+        while uids := record_manager.list_keys(before=start, limit=1000):
+            writer.delete(uids, collection_only=True)
+            record_manager.delete_keys(uids)
+            num_deleted += len(uids)
+        return num_deleted
+
+    def _delete_sources(self, record_manager, sources, writer):
+        # Drop every chunk recorded for the given sources from the vector store and the record manager
+        uids = record_manager.list_keys(group_ids=sources)
+        if uids:
+            writer.delete(uids, collection_only=True)
+            record_manager.delete_keys(uids)
+        return len(uids)
+
 # index = IndexService()
 # result = index.all("/path/to/source", "local")
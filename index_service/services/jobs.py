@@ -0,0 +1,138 @@
+import os
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from index_service.services.pipeline import IngestCancelled
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IndexJob:
+    def __init__(self, source: str, storage_type: str, incremental: bool = False, chunking: str = "recursive", collection: str = None, study_id: str = None):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.storage_type = storage_type
+        self.incremental = incremental
+        self.chunking = chunking
+        self.collection = collection
+        self.study_id = study_id
+        self.status = "queued"
+        # Filled in live by the ingest pipeline and vector writer
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_on = datetime.now(timezone.utc)
+        self.started_on = None
+        self.finished_on = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "source": self.source,
+            "storage_type": self.storage_type,
+            "incremental": self.incremental,
+            "chunking": self.chunking,
+            "collection": self.collection,
+            "study_id": self.study_id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_on": self.created_on,
+            "started_on": self.started_on,
+            "finished_on": self.finished_on,
+        }
+
+
+class JobManager:
+    """
+    Runs index jobs on background worker threads, off the request path.
+
+    Parsing already fans out to a process pool inside each run, so the job
+    workers mostly wait on I/O. Finished jobs are kept in memory for polling
+    until more than `INDEX_JOB_HISTORY` have accumulated.
+    """
+
+    def __init__(self, index_service):
+        self.index_service = index_service
+        self.INDEX_JOB_WORKERS = int(os.getenv("INDEX_JOB_WORKERS", "1"))
+        self.INDEX_JOB_HISTORY = int(os.getenv("INDEX_JOB_HISTORY", "100"))
+
+        self.executor = ThreadPoolExecutor(max_workers=self.INDEX_JOB_WORKERS, thread_name_prefix="index-job")
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, source: str, storage_type: str, incremental: bool = False, chunking: str = "recursive", collection: str = None, study_id: str = None) -> IndexJob:
+        job = IndexJob(source, storage_type, incremental, chunking, collection, study_id)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        job.future = self.executor.submit(self._run, job)
+        logger.info(f"Queued index job {job.id} for {storage_type}:{source}")
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return list(self.jobs.values())
+
+    def cancel(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        job.cancel_event.set()
+        # A job that has not started yet can be dropped from the queue straight away
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            job.finished_on = datetime.now(timezone.utc)
+        return job
+
+    def _run(self, job: IndexJob):
+        # Cancelled while queued, after future.cancel() lost the race with this worker
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            job.finished_on = datetime.now(timezone.utc)
+            return
+
+        job.status = "running"
+        job.started_on = datetime.now(timezone.utc)
+        try:
+            job.result = self.index_service.all(
+                job.source,
+                job.storage_type,
+                job.incremental,
+                job.chunking,
+                progress=job.progress,
+                cancel_event=job.cancel_event,
+                collection=job.collection,
+                study_id=job.study_id
+            )
+            job.status = "completed"
+        except IngestCancelled:
+            logger.info(f"Index job {job.id} cancelled")
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"Index job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_on = datetime.now(timezone.utc)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(len(self.jobs) - self.INDEX_JOB_HISTORY, 0)]:
+            del self.jobs[job_id]
@@ -0,0 +1,247 @@
+import io
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Iterator, List, Tuple, Union
+
+import pypdf
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def parse_pdf(file: Union[str, bytes, BinaryIO]) -> List[Document]:
+    # One Document per page with `source` and `page` metadata, as PyPDFDirectoryLoader produced
+    if isinstance(file, str):
+        return PyPDFLoader(file, extract_images=False).load()
+
+    # In-memory bodies carry no path; the caller fills in `source`
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+    reader = pypdf.PdfReader(file)
+    return [
+        Document(page_content=page.extract_text(), metadata={"source": None, "page": page_number})
+        for page_number, page in enumerate(reader.pages)
+    ]
+
+
+def parse_and_split(file: Union[str, bytes, BinaryIO], text_splitter, source: str = None) -> Tuple[List[Document], float]:
+    # Unit of work for the parse stage: one PDF in, its chunks and the parse time out
+    start = time.perf_counter()
+    pages = parse_pdf(file)
+    if source is not None:
+        # The file may have been parsed from a scratch copy; record where it really lives
+        for page in pages:
+            page.metadata["source"] = source
+    chunks = text_splitter.split_documents(pages)
+    return chunks, time.perf_counter() - start
+
+
+class IngestPipeline:
+    """
+    Streams a storage backend through list -> download -> parse/split stages.
+
+    Stages run in their own threads and hand work on through bounded queues, so a
+    slow consumer blocks the producers instead of letting the corpus pile up in
+    memory. Iterating the pipeline yields chunks as soon as they are split, which
+    lets `index()` embed and write early batches while later files are still
+    downloading.
+
+    pypdf extraction is CPU bound, so with `parse_processes` > 0 each PDF is
+    parsed and chunked in a process pool of that size instead of in-process.
+
+    `file_filter` lets callers drop files at the list stage, e.g. ones already
+    indexed at the same version, so they are never downloaded or parsed.
+
+    Counters are kept in `stats`, which may be a dict shared with the caller to
+    report progress while the run is going. Setting `cancel_event` stops every
+    stage and makes iteration raise `IngestCancelled`.
+
+    A file that cannot be fetched or parsed is skipped rather than failing the
+    run and is recorded in `failed`.
+    """
+
+    def __init__(self, storage, text_splitter, queue_size=100, download_workers=10, parse_processes=0, file_filter=None, stats=None, cancel_event=None):
+        self.storage = storage
+        self.text_splitter = text_splitter
+        self.queue_size = queue_size
+        self.download_workers = download_workers
+        self.parse_processes = parse_processes
+        # Called with each listed file; returning False skips it before download
+        self.file_filter = file_filter
+
+        self.stats = stats if stats is not None else {}
+        for key in ("files_listed", "files_skipped", "files_failed", "files_parsed", "chunks", "parse_seconds"):
+            self.stats.setdefault(key, 0)
+        self.cancel_event = cancel_event
+        # Files whose chunks have all been handed to the consumer
+        self.completed = []
+        # (file, error) for files that could not be fetched or parsed
+        self.failed = []
+        self._stats_lock = threading.Lock()
+        self._executor = None
+        self._stop = threading.Event()
+        self._errors = []
+
+    def __iter__(self) -> Iterator[Document]:
+        files = queue.Queue(maxsize=self.queue_size)
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        chunks = queue.Queue(maxsize=self.queue_size)
+
+        threads = [threading.Thread(target=self._list, args=(files,), daemon=True)]
+        threads += self._stage(self._download, files, downloaded, self.download_workers)
+        threads += self._stage(self._parse, downloaded, chunks, max(self.parse_processes, 1))
+
+        if self.parse_processes > 0:
+            # Spawned workers don't inherit the locks held by this process' threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.parse_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(chunks)
+                if self._cancelled():
+                    raise IngestCancelled("Ingest cancelled")
+                if self._errors:
+                    raise self._errors[0]
+                if item is _DONE:
+                    break
+                file, file_chunks = item
+                for chunk in file_chunks:
+                    self.stats["chunks"] += 1
+                    yield chunk
+                self.completed.append(file)
+        finally:
+            # Unblock every stage if the consumer stopped early or a stage failed
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+            self.storage.close()
+
+    def _stage(self, fn, inbox, outbox, workers):
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def run():
+            try:
+                while not self._stop.is_set() and not self._cancelled():
+                    item = self._get(inbox)
+                    if item is _DONE:
+                        # Let sibling workers see the end of input too
+                        self._put(inbox, _DONE)
+                        break
+                    result = fn(item)
+                    if result is not None:
+                        self._put(outbox, result)
+            except Exception as e:
+                self._fail(e)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._put(outbox, _DONE)
+
+        return [threading.Thread(target=run, daemon=True) for _ in range(workers)]
+
+    def _list(self, outbox):
+        try:
+            for file in self.storage.list_files():
+                self.stats["files_listed"] += 1
+                if self.file_filter is not None and not self.file_filter(file):
+                    self.stats["files_skipped"] += 1
+                    continue
+                if not self._put(outbox, file):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(outbox, _DONE)
+
+    def _download(self, file):
+        try:
+            local_file = self.storage.fetch(file)
+        except Exception as e:
+            logger.error(f"Skipping {file}, download failed: {e}")
+            with self._stats_lock:
+                self.failed.append((file, str(e)))
+                self.stats["files_failed"] += 1
+            return None
+        return file, local_file
+
+    def _parse(self, item):
+        # local_file is a path on disk, or a binary buffer for storages that fetch into memory
+        file, local_file = item
+        source = self.storage.source_id(file)
+        try:
+            if self._executor is not None:
+                # Buffers can't be pickled, so their bytes are sent to the worker instead
+                payload = local_file if isinstance(local_file, str) else local_file.read()
+                chunks, elapsed = self._executor.submit(parse_and_split, payload, self.text_splitter, source).result()
+            else:
+                chunks, elapsed = parse_and_split(local_file, self.text_splitter, source)
+        except BrokenProcessPool:
+            # A dead pool fails every file after it, so it fails the run
+            raise
+        except Exception as e:
+            # e.g. a corrupt or encrypted PDF
+            logger.error(f"Skipping {file}, parsing failed: {e}")
+            with self._stats_lock:
+                self.failed.append((file, str(e)))
+                self.stats["files_failed"] += 1
+            return None
+        finally:
+            self.storage.release(local_file)
+
+        logger.info(f"Parsed {file} into {len(chunks)} chunks in {elapsed:.2f}s")
+        with self._stats_lock:
+            self.stats["files_parsed"] += 1
+            self.stats["parse_seconds"] += elapsed
+        return file, chunks
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set() or self._cancelled():
+                    return _DONE
+
+    def _put(self, q, item):
+        # Blocks while the downstream queue is full; gives up once the pipeline stops
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._stop.is_set() or self._cancelled():
+                    return False
+
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _fail(self, error):
+        logger.error(f"Ingest pipeline failed: {error}")
+        self._errors.append(error)
+        self._stop.set()
@@ -0,0 +1,70 @@
+import logging
+from typing import Any, Iterable, List, Optional
+
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class VectorWriter(VectorStore):
+    """
+    Write path handed to `index()` in place of the PGVector store.
+
+    `index()` only needs `add_documents` and `delete`; routing them through this
+    class lets a run count what it embedded and wrote into `stats`. With an
+    `embedder` the vectors come from that stage (cached, batched, concurrent)
+    and are written with `add_embeddings`, instead of PGVector embedding them.
+    A `bulk_writer` replaces `add_embeddings` with COPY-based batch loads.
+    """
+
+    def __init__(self, vectorstore, embedder=None, stats=None, bulk_writer=None):
+        self.vectorstore = vectorstore
+        self.embedder = embedder
+        self.bulk_writer = bulk_writer
+        self.stats = stats if stats is not None else {}
+        for key in ("chunks_embedded", "rows_written", "rows_deleted"):
+            self.stats.setdefault(key, 0)
+
+    @property
+    def embeddings(self):
+        return self.vectorstore.embeddings
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        if self.embedder is None and self.bulk_writer is None:
+            ids = self.vectorstore.add_documents(documents, **kwargs)
+        else:
+            texts = [doc.page_content for doc in documents]
+            metadatas = [doc.metadata for doc in documents]
+            if self.embedder is not None:
+                vectors = self.embedder.embed(texts, self.stats)
+            else:
+                vectors = self.embeddings.embed_documents(texts)
+
+            if self.bulk_writer is not None:
+                ids = self.bulk_writer.write(texts, vectors, metadatas, ids=kwargs.get("ids"))
+            else:
+                ids = self.vectorstore.add_embeddings(texts, vectors, metadatas, ids=kwargs.get("ids"))
+        self.stats["chunks_embedded"] += len(documents)
+        self.stats["rows_written"] += len(documents)
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_documents(documents, **kwargs)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        self.vectorstore.delete(ids, **kwargs)
+        self.stats["rows_deleted"] += len(ids or [])
+        return True
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.vectorstore.similarity_search(query, k=k, **kwargs)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("VectorWriter wraps an existing vector store")
@@ -0,0 +1,152 @@
+import re
+import math
+import time
+import logging
+from sqlalchemy import create_engine, text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+ANN_METHODS = ("hnsw", "ivfflat")
+# Must match the distance PGVector searches with, or the planner ignores the index
+OPERATOR_CLASSES = {
+    "cosine": "vector_cosine_ops",
+    "euclidean": "vector_l2_ops",
+    "max_inner_product": "vector_ip_ops",
+}
+
+
+class ANNIndexManager:
+    """
+    Creates, rebuilds and drops the HNSW / IVFFlat index on the PGVector embedding column.
+
+    All collections share `langchain_pg_embedding`, so one index serves every
+    collection. langchain-postgres creates the column as an unsized `vector`,
+    which pgvector cannot index. Pinning it to the dimension of the stored
+    embeddings rewrites the table under an ACCESS EXCLUSIVE lock, so a build
+    only does it when called with `pin_dimensions`. Rebuilds build the new
+    index concurrently next to the old one, then drop the old one and rename
+    the new one in a single short transaction, so searches always have an index.
+    """
+
+    # How long the swap waits for searches holding the table before giving up
+    SWAP_LOCK_TIMEOUT = "5s"
+
+    def __init__(self, db_url, distance="cosine", maintenance_work_mem=None):
+        if distance not in OPERATOR_CLASSES:
+            raise ValueError(f"Unsupported distance: {distance}")
+        if maintenance_work_mem and not re.fullmatch(r"\d+(kB|MB|GB)", maintenance_work_mem):
+            raise ValueError(f"Invalid maintenance_work_mem: {maintenance_work_mem}")
+        self.operator_class = OPERATOR_CLASSES[distance]
+        self.maintenance_work_mem = maintenance_work_mem
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+        self.engine = create_engine(db_url, isolation_level="AUTOCOMMIT")
+
+    @staticmethod
+    def index_name(method):
+        return f"{EMBEDDING_TABLE}_embedding_{method}_idx"
+
+    def create(self, method="hnsw", m=16, ef_construction=64, lists=None, rebuild=False, pin_dimensions=False):
+        if method not in ANN_METHODS:
+            raise ValueError(f"Unsupported ANN index method: {method}")
+        name = self.index_name(method)
+
+        with self.engine.connect() as conn:
+            if self._exists(conn, name) and not rebuild:
+                logger.info(f"{name} already exists, pass rebuild to replace it.")
+                return {"index": name, "method": method, "created": False}
+
+            dimensions = self._ensure_dimensions(conn, pin_dimensions)
+
+            match method:
+                case 'hnsw':
+                    options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+                case 'ivfflat':
+                    if lists is None:
+                        # pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) above
+                        rows = conn.execute(text(f"SELECT count(*) FROM {EMBEDDING_TABLE}")).scalar()
+                        lists = max(rows // 1000, 1) if rows <= 1_000_000 else int(math.sqrt(rows))
+                    options = f"lists = {int(lists)}"
+
+            if self.maintenance_work_mem:
+                conn.execute(text(f"SET maintenance_work_mem = '{self.maintenance_work_mem}'"))
+
+            start = time.perf_counter()
+            # A build that failed half-way leaves an invalid index behind
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}_new"))
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY {name}_new ON {EMBEDDING_TABLE} "
+                f"USING {method} (embedding {self.operator_class}) WITH ({options})"
+            ))
+            self._swap(conn, name)
+            seconds = time.perf_counter() - start
+
+        logger.info(f"Built {name} ({options}) in {seconds:.1f}s")
+        return {
+            "index": name,
+            "method": method,
+            "created": True,
+            "dimensions": dimensions,
+            "options": options,
+            "build_seconds": seconds,
+        }
+
+    def drop(self, method):
+        if method not in ANN_METHODS:
+            raise ValueError(f"Unsupported ANN index method: {method}")
+        with self.engine.connect() as conn:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.index_name(method)}"))
+
+    def status(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT i.indexname, i.indexdef, pg_relation_size(c.oid), x.indisvalid "
+                "FROM pg_indexes i JOIN pg_class c ON c.relname = i.indexname "
+                "JOIN pg_index x ON x.indexrelid = c.oid "
+                "WHERE i.tablename = :table AND i.indexdef ~* 'USING (hnsw|ivfflat)'"
+            ), {"table": EMBEDDING_TABLE})
+            return [
+                {"index": name, "definition": definition, "size_bytes": size, "valid": valid}
+                for name, definition, size, valid in rows
+            ]
+
+    def _swap(self, conn, name):
+        # Both steps commit together; the plain DROP briefly takes the table's
+        # ACCESS EXCLUSIVE lock, and lock_timeout stops it queueing searches for long
+        conn.execute(text("BEGIN"))
+        try:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{self.SWAP_LOCK_TIMEOUT}'"))
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            conn.execute(text(f"ALTER INDEX {name}_new RENAME TO {name}"))
+            conn.execute(text("COMMIT"))
+        except Exception:
+            conn.execute(text("ROLLBACK"))
+            raise
+
+    def _exists(self, conn, name):
+        return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+    def _ensure_dimensions(self, conn, pin_dimensions=False):
+        # pgvector stores the dimension as the column's type modifier, -1 when unsized
+        dimensions = conn.execute(text(
+            "SELECT atttypmod FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding'"
+        ), {"table": EMBEDDING_TABLE}).scalar()
+        if dimensions and dimensions > 0:
+            return dimensions
+
+        found = conn.execute(text(f"SELECT DISTINCT vector_dims(embedding) FROM {EMBEDDING_TABLE} LIMIT 2")).scalars().all()
+        if len(found) != 1:
+            raise ValueError(f"Cannot size the embedding column, found dimensions {found}")
+
+        if not pin_dimensions:
+            raise ValueError(
+                f"{EMBEDDING_TABLE}.embedding has no fixed dimension. Pinning it to vector({found[0]}) rewrites "
+                "the table under an ACCESS EXCLUSIVE lock, blocking searches and index runs until it finishes; "
+                "pass pin_dimensions to do it."
+            )
+        # Takes an exclusive lock on the table and rewrites every row
+        logger.warning(f"Pinning {EMBEDDING_TABLE}.embedding to vector({found[0]})")
+        conn.execute(text(f"ALTER TABLE {EMBEDDING_TABLE} ALTER COLUMN embedding TYPE vector({int(found[0])})"))
+        return found[0]
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import threading
+from array import array
+from sqlalchemy import Column, String, LargeBinary, DateTime, create_engine, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.sql import func
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Base = declarative_base()
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = 'embedding_cache'
+
+    model = Column(String, primary_key=True)
+    content_hash = Column(String, primary_key=True)
+    # float32 vector, 4 bytes per dimension
+    vector = Column(LargeBinary, nullable=False)
+    created_on = Column(DateTime(timezone=True), server_default=func.now())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-hash -> vector cache shared by every index run.
+
+    Lives in the vector database by default; pointing `db_url` at a
+    `sqlite:///` file keeps it on local disk instead.
+    """
+
+    def __init__(self, db_url, batch_size=1000):
+        self.batch_size = batch_size
+        self.engine = create_engine(db_url)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+
+        # Lifetime counters for this process
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def create_schema(self):
+        Base.metadata.create_all(self.engine)
+
+    def mget(self, model, hashes):
+        # Returns hash -> vector for the hashes that are cached
+        found = {}
+        with self.SessionLocal() as session:
+            for i in range(0, len(hashes), self.batch_size):
+                rows = session.execute(
+                    select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.vector)
+                    .where(EmbeddingCacheEntry.model == model)
+                    .where(EmbeddingCacheEntry.content_hash.in_(hashes[i:i+self.batch_size]))
+                )
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+        return found
+
+    def mset(self, model, vectors):
+        # vectors: hash -> vector
+        rows = [
+            {"model": model, "content_hash": key, "vector": array('f', vector).tobytes()}
+            for key, vector in vectors.items()
+        ]
+        with self.SessionLocal() as session:
+            for i in range(0, len(rows), self.batch_size):
+                stmt = self.insert(EmbeddingCacheEntry).values(rows[i:i+self.batch_size]).on_conflict_do_nothing()
+                session.execute(stmt)
+            session.commit()
+
+    def record(self, hits, misses):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,46 @@
+import re
+import logging
+from sqlalchemy import create_engine, text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+TSV_COLUMN = "document_tsv"
+
+
+class LexicalIndex:
+    """
+    Full-text search column for hybrid retrieval.
+
+    Adds `document_tsv` to `langchain_pg_embedding` as a stored generated column
+    with a GIN index, so Postgres computes it for every chunk as it is written,
+    whether through PGVector or the COPY writer. The retrieval service must
+    query it with the same text search configuration.
+    """
+
+    def __init__(self, db_url, config="english"):
+        # Inlined into the column definition, which cannot take bind parameters
+        if not re.fullmatch(r"[a-z_]+", config):
+            raise ValueError(f"Invalid text search configuration: {config}")
+        self.config = config
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        self.engine = create_engine(db_url, isolation_level="AUTOCOMMIT")
+
+    def ensure(self):
+        with self.engine.connect() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+            ), {"table": EMBEDDING_TABLE, "column": TSV_COLUMN}).scalar()
+            if not exists:
+                # Rewrites the table once to fill the column for the chunks already stored
+                logger.info(f"Adding {TSV_COLUMN} ({self.config}) to {EMBEDDING_TABLE}")
+                conn.execute(text(
+                    f"ALTER TABLE {EMBEDDING_TABLE} ADD COLUMN IF NOT EXISTS {TSV_COLUMN} tsvector "
+                    f"GENERATED ALWAYS AS (to_tsvector('{self.config}'::regconfig, coalesce(document, ''))) STORED"
+                ))
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {EMBEDDING_TABLE}_{TSV_COLUMN}_idx "
+                f"ON {EMBEDDING_TABLE} USING gin ({TSV_COLUMN})"
+            ))
@@ -0,0 +1,107 @@
+import logging
+from sqlalchemy import Column, String, Integer, DateTime, create_engine, delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.sql import func
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Base = declarative_base()
+
+
+class ManifestEntry(Base):
+    __tablename__ = 'index_manifest'
+
+    namespace = Column(String, primary_key=True)
+    file_id = Column(String, primary_key=True)
+    version = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    updated_on = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CollectionVersionEntry(Base):
+    __tablename__ = 'index_collection_version'
+
+    collection_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_on = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class IndexManifest:
+    """
+    Remembers which version of every source file was last indexed into a namespace,
+    so incremental runs can skip unchanged files before downloading them.
+    """
+
+    def __init__(self, namespace, db_url, batch_size=1000):
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.engine = create_engine(db_url)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+
+    def create_schema(self):
+        Base.metadata.create_all(self.engine)
+
+    def load(self):
+        # file_id -> (version, source)
+        with self.SessionLocal() as session:
+            rows = session.execute(
+                select(ManifestEntry.file_id, ManifestEntry.version, ManifestEntry.source)
+                .where(ManifestEntry.namespace == self.namespace)
+            )
+            return {file_id: (version, source) for file_id, version, source in rows}
+
+    def update(self, entries):
+        # entries: file_id -> (version, source)
+        rows = [
+            {"namespace": self.namespace, "file_id": file_id, "version": version, "source": source}
+            for file_id, (version, source) in entries.items()
+        ]
+        with self.SessionLocal() as session:
+            for i in range(0, len(rows), self.batch_size):
+                stmt = insert(ManifestEntry).values(rows[i:i+self.batch_size])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[ManifestEntry.namespace, ManifestEntry.file_id],
+                    set_={"version": stmt.excluded.version, "source": stmt.excluded.source, "updated_on": func.now()}
+                )
+                session.execute(stmt)
+            session.commit()
+        logger.info(f"Manifest updated for {len(rows)} files.")
+
+    def delete(self, file_ids):
+        file_ids = list(file_ids)
+        with self.SessionLocal() as session:
+            for i in range(0, len(file_ids), self.batch_size):
+                session.execute(
+                    delete(ManifestEntry)
+                    .where(ManifestEntry.namespace == self.namespace)
+                    .where(ManifestEntry.file_id.in_(file_ids[i:i+self.batch_size]))
+                )
+            session.commit()
+
+
+class CollectionVersions:
+    """
+    A counter per collection, bumped after every index run that changed it.
+    The retrieval service polls it to drop the results it cached for that collection.
+    """
+
+    def __init__(self, db_url):
+        self.engine = create_engine(db_url)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+
+    def create_schema(self):
+        Base.metadata.create_all(self.engine)
+
+    def bump(self, collection_name):
+        stmt = insert(CollectionVersionEntry).values(collection_name=collection_name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CollectionVersionEntry.collection_name],
+            set_={"version": CollectionVersionEntry.version + 1, "updated_on": func.now()}
+        )
+        with self.SessionLocal() as session:
+            session.execute(stmt)
+            session.commit()
+        logger.info(f"Collection {collection_name} version bumped.")
@@ -0,0 +1,95 @@
+import io
+import csv
+import json
+import uuid
+import logging
+import psycopg2
+from psycopg2 import sql
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+COLLECTION_TABLE = "langchain_pg_collection"
+COLUMNS = ["id", "collection_id", "embedding", "document", "cmetadata"]
+
+
+class PGCopyWriter:
+    """
+    Bulk writer for the PGVector embedding table.
+
+    Each call streams its rows with COPY into a temporary staging table and
+    upserts them into `langchain_pg_embedding` in a single transaction, instead
+    of PGVector's one multi-row INSERT built through the ORM per batch.
+    """
+
+    def __init__(self, db_url, collection_name):
+        # Correcting the connection string to be compatible with psycopg2
+        self.db_url = db_url.replace('postgresql+psycopg2', 'postgresql').replace('postgresql+psycopg', 'postgresql')
+        self.collection_name = collection_name
+        self.conn = None
+        self.collection_id = None
+
+    def _connect(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(self.db_url)
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("SELECT uuid FROM {} WHERE name = %s").format(sql.Identifier(COLLECTION_TABLE)),
+                    [self.collection_name]
+                )
+                row = cur.fetchone()
+                if row is None:
+                    raise ValueError(f"Collection {self.collection_name} not found")
+                self.collection_id = row[0]
+
+                # Emptied by every commit, so each write starts from a clean staging table
+                cur.execute(
+                    sql.SQL("CREATE TEMP TABLE IF NOT EXISTS ingest_staging (LIKE {} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+                    .format(sql.Identifier(EMBEDDING_TABLE))
+                )
+            self.conn.commit()
+        return self.conn
+
+    def write(self, texts, embeddings, metadatas=None, ids=None):
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        if not metadatas:
+            metadatas = [{} for _ in texts]
+
+        conn = self._connect()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for id, text, embedding, metadata in zip(ids, texts, embeddings, metadatas):
+            vector = "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+            writer.writerow([id, self.collection_id, vector, text, json.dumps(metadata or {})])
+        buffer.seek(0)
+
+        columns = sql.SQL(", ").join(map(sql.Identifier, COLUMNS))
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(
+                    sql.SQL("COPY ingest_staging ({}) FROM STDIN WITH (FORMAT csv)").format(columns).as_string(conn),
+                    buffer
+                )
+                # Only update rows of this collection, never move another collection's row
+                cur.execute(
+                    sql.SQL(
+                        "INSERT INTO {table} ({columns}) SELECT {columns} FROM ingest_staging "
+                        "ON CONFLICT (id) DO UPDATE SET "
+                        "embedding = EXCLUDED.embedding, document = EXCLUDED.document, cmetadata = EXCLUDED.cmetadata "
+                        "WHERE {table}.collection_id = EXCLUDED.collection_id"
+                    ).format(table=sql.Identifier(EMBEDDING_TABLE), columns=columns)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        return ids
+
+    def close(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
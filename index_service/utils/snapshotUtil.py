@@ -0,0 +1,172 @@
+import os
+import json
+import uuid
+import shutil
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_DTYPES = ("float32", "float16")
+
+
+class CollectionNotFound(ValueError):
+    pass
+
+
+def collection_id(conn, collection_name):
+    found = conn.execute(
+        text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"), {"name": collection_name}
+    ).scalar()
+    if found is None:
+        raise CollectionNotFound(f"Collection {collection_name} not found")
+    return found
+
+
+def record_manager_version(conn, namespace):
+    """
+    Version of a collection's contents, from the SQLRecordManager rows of its namespace.
+
+    index() stamps every chunk it writes or re-confirms and the cleanups delete the
+    rest, so the row count and the latest timestamp move on with every index run
+    that reached the vector store.
+    """
+    count, updated_at = conn.execute(text(
+        "SELECT count(*), max(updated_at) FROM upsertion_record WHERE namespace = :namespace"
+    ), {"namespace": namespace}).one()
+    return f"{count}-{updated_at or 0:.6f}"
+
+
+class SnapshotExporter:
+    """
+    Exports a PGVector collection as a snapshot the retrieval service's local backend memory-maps:
+
+        manifest.json    format, collection, count, dimensions, dtype and version
+        vectors.npy      unit-length embeddings, one row per chunk
+        documents.jsonl  {"id", "document", "metadata"} per row, in matrix order
+
+    Rows are read in one REPEATABLE READ transaction, so the matrix, the sidecar
+    and the version agree even while an index run writes. The snapshot is
+    written next to the previous one and swapped in when complete.
+    """
+
+    def __init__(self, db_url, directory, batch_size=2000):
+        self.engine = create_engine(db_url, isolation_level="REPEATABLE READ")
+        self.directory = directory
+        self.batch_size = batch_size
+
+    def path(self, collection_name):
+        return os.path.join(self.directory, collection_name)
+
+    def export(self, collection_name, namespace, dtype="float32", embedding_model=None):
+        if dtype not in SNAPSHOT_DTYPES:
+            raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+
+        target = self.path(collection_name)
+        staging = f"{target}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(staging)
+        try:
+            with self.engine.connect() as conn:
+                manifest = self._write(conn, collection_name, namespace, dtype, staging)
+            manifest["embedding_model"] = embedding_model
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        # Retrieval pods keep serving the snapshot they loaded while the directories swap
+        if os.path.exists(target):
+            previous = f"{target}.old-{uuid.uuid4().hex[:8]}"
+            os.rename(target, previous)
+            os.rename(staging, target)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.rename(staging, target)
+
+        logger.info(f"Exported {manifest['count']} chunks of {collection_name} to {target} (version {manifest['version']})")
+        return {"path": target, **manifest}
+
+    def status(self, collection_name, namespace):
+        with self.engine.connect() as conn:
+            collection_id(conn, collection_name)
+            current = record_manager_version(conn, namespace)
+        try:
+            with open(os.path.join(self.path(collection_name), "manifest.json")) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"collection": collection_name, "exists": False, "current_version": current, "stale": True}
+        return {
+            "collection": collection_name,
+            "exists": True,
+            "version": manifest.get("version"),
+            "current_version": current,
+            "stale": manifest.get("version") != current,
+            "count": manifest.get("count"),
+            "dtype": manifest.get("dtype"),
+            "created_on": manifest.get("created_on"),
+        }
+
+    def _write(self, conn, collection_name, namespace, dtype, staging):
+        collection_uuid = collection_id(conn, collection_name)
+        version = record_manager_version(conn, namespace)
+        count, dimensions = conn.execute(text(
+            "SELECT count(*), max(vector_dims(embedding)) FROM langchain_pg_embedding WHERE collection_id = :collection_id"
+        ), {"collection_id": collection_uuid}).one()
+
+        # Filled row by row on disk, the collection never has to fit in memory
+        vectors = np.lib.format.open_memmap(
+            os.path.join(staging, "vectors.npy"), mode="w+", dtype=dtype, shape=(count, dimensions or 0)
+        )
+        rows = conn.execution_options(yield_per=self.batch_size).execute(text(
+            "SELECT id, document, cmetadata, CAST(embedding AS real[]) FROM langchain_pg_embedding "
+            "WHERE collection_id = :collection_id ORDER BY id"
+        ), {"collection_id": collection_uuid})
+        with open(os.path.join(staging, "documents.jsonl"), "w") as f:
+            for i, (chunk_id, document, metadata, embedding) in enumerate(rows):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors[i] = vector / norm if norm else vector
+                f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata}) + "\n")
+        vectors.flush()
+        del vectors
+
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "collection": collection_name,
+            "count": count,
+            "dimensions": dimensions or 0,
+            "dtype": dtype,
+            "distance": "cosine",
+            "version": version,
+            "created_on": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+def main():
+    # python -m index_service.utils.snapshotUtil --collection vector --dtype float16
+    from index_service.services.indexing import IndexService
+
+    parser = argparse.ArgumentParser(description="Export a collection snapshot for the retrieval service's local backend.")
+    parser.add_argument("--collection", default=None)
+    parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default=None)
+    parser.add_argument("--status", action="store_true", help="only report whether the current snapshot is stale")
+    args = parser.parse_args()
+
+    service = IndexService()
+    if args.status:
+        result = service.snapshot_status(args.collection)
+    else:
+        result = service.export_snapshot(args.collection, args.dtype)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
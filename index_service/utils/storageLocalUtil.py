@@ -1,8 +1,7 @@
 import os
 import shutil
 import logging
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pathlib import Path
 
 class LocalStorage:
     def __init__(self, source_directory):
@@ -15,22 +14,36 @@ class LocalStorage:
         if not os.path.exists(self.source_directory):
             os.makedirs(self.source_directory)
 
-    def load_documents(self):
-        loader = PyPDFDirectoryLoader(self.source_directory, extract_images=False)
-        documents = loader.load()
+    def list_files(self):
+        # Same selection as PyPDFDirectoryLoader: every visible PDF below the source directory
+        root = Path(self.source_directory)
+        found = False
+        for path in sorted(root.glob("**/[!.]*.pdf")):
+            if path.is_file() and not any(part.startswith(".") for part in path.relative_to(root).parts):
+                found = True
+                yield str(path)
 
-        if not documents:
+        if not found:
             self.logger.error("No documents found in the source directory.")
-            return []
-        else:
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=32, separators=["\n\n", "\n", " ", ""])
-            docs = text_splitter.split_documents(documents)
 
-            ## adding custom metadata
-            # for i, chunks in enumerate(docs):
-            #     docs[i].metadata['value'] = "test"
+    def version(self, file_path):
+        # mtime + size changes whenever the file is replaced or edited
+        stat = os.stat(file_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
 
-        return docs
+    def source_id(self, file_path):
+        # PyPDFLoader records the path it read as the `source` metadata
+        return file_path
+
+    def fetch(self, file_path):
+        # Files are already on local disk
+        return file_path
+
+    def release(self, local_path):
+        pass
+
+    def close(self):
+        pass
 
     def _move_files(self, files):
         for file_name in files:
@@ -40,4 +53,4 @@ class LocalStorage:
 
 
 # processor = LocalStorage('source_directory')
-# documents = processor.load_documents()
+# files = processor.list_files()
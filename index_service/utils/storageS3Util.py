@@ -1,94 +1,121 @@
 import os
-import shutil
+import time
 import boto3
+import shutil
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from botocore.exceptions import NoCredentialsError, ClientError
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import tempfile
+import threading
+from botocore.exceptions import NoCredentialsError, ClientError, BotoCoreError
+
+# Chunks keep the path the original shared download directory gave them as their
+# `source`, so records written before per-job directories still match
+SOURCE_ROOT = '/tmp/s3_temp'
 
 
 class S3Storage:
-    def __init__(self, source_bucket, aws_access_key_id=None, aws_secret_access_key=None, region_name=None, batch_size=100, max_workers=10):
+    def __init__(self, source_bucket, aws_access_key_id=None, aws_secret_access_key=None, region_name=None, max_retries=3, retry_backoff=0.5, in_memory=False, spool_threshold=16 * 1024 * 1024, prefix=''):
         self.source_bucket = source_bucket
-        self.s3 = boto3.client('s3', 
-                               aws_access_key_id=aws_access_key_id, 
-                               aws_secret_access_key=aws_secret_access_key, 
+        # Only list keys below this prefix, e.g. one study's tmf/{study_id}/ folder
+        self.prefix = prefix
+        self.s3 = boto3.client('s3',
+                               aws_access_key_id=aws_access_key_id,
+                               aws_secret_access_key=aws_secret_access_key,
                                region_name=region_name)
-        self.batch_size = batch_size
-        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # Keep object bodies in memory, spilling to disk only above spool_threshold bytes
+        self.in_memory = in_memory
+        self.spool_threshold = spool_threshold
+        # Private to this run, so concurrent jobs never touch each other's files. Created
+        # on the first fetch, so a run that fails while listing leaves nothing behind
+        self.temp_directory = None
+        self._temp_lock = threading.Lock()
+        self._versions = {}
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-    def load_documents(self):
+    def list_files(self):
         try:
-            files = []
-            continuation_token = None
-
-            # Paginate through all objects in the source bucket
-            while True:
-                if continuation_token:
-                    response = self.s3.list_objects_v2(Bucket=self.source_bucket, ContinuationToken=continuation_token)
-                else:
-                    response = self.s3.list_objects_v2(Bucket=self.source_bucket)
-
-                if 'Contents' in response:
-                    files.extend([obj['Key'] for obj in response['Contents'] if obj['Key'].endswith('.pdf')])
-
-                if 'NextContinuationToken' in response:
-                    continuation_token = response['NextContinuationToken']
-                else:
-                    break
-
-            if not files:
+            found = False
+            paginator = self.s3.get_paginator('list_objects_v2')
+
+            # Paginate through all objects in the source bucket, one page in memory at a time
+            for response in paginator.paginate(Bucket=self.source_bucket, Prefix=self.prefix):
+                for obj in response.get('Contents', []):
+                    if obj['Key'].endswith('.pdf'):
+                        found = True
+                        etag = obj['ETag'].strip('"')
+                        self._versions[obj['Key']] = f"{etag}-{obj['LastModified'].isoformat()}"
+                        yield obj['Key']
+
+            if not found:
                 self.logger.error("No PDF files found in the source bucket.")
-                return []
-
-            # Process files in batches
-            documents = []
-            for i in range(0, len(files), self.batch_size):
-                batch_files = files[i:i+self.batch_size]
-                documents.extend(self._process_batch(batch_files))
-
-            return documents
 
         except NoCredentialsError:
             self.logger.error("Credentials not available.")
-            return []
+            raise
         except ClientError as e:
             self.logger.error(f"Client error: {e}")
-            return []
-
-    def _process_batch(self, batch_files):
-        temp_directory = '/tmp/s3_temp'
-        os.makedirs(temp_directory, exist_ok=True)
-        local_files = []
-
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            for file_key in batch_files:
-                local_path = os.path.join(temp_directory, file_key)
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                executor.submit(self._download_file, file_key, local_path)
-                local_files.append(local_path)
-
-        loader = PyPDFDirectoryLoader(temp_directory, extract_images=False)
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=32, separators=["\n\n", "\n", " ", ""])
-        docs = text_splitter.split_documents(documents)
-        
-        ## adding custom metadata
-        # for i, chunks in enumerate(docs):
-        #     docs[i].metadata['value'] = "test"
-
-        shutil.rmtree(temp_directory)
-        return docs
-
-    def _download_file(self, file_key, local_path):
+            raise
+
+    def version(self, file_key):
+        # ETag and LastModified come with the listing, so no extra request per object
+        return self._versions.get(file_key)
+
+    def source_id(self, file_key):
+        return os.path.join(SOURCE_ROOT, file_key)
+
+    def fetch(self, file_key):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.in_memory:
+                    return self._read_object(file_key)
+                return self._download_object(file_key)
+            except (ClientError, BotoCoreError, OSError) as e:
+                # An object deleted since it was listed will not come back
+                not_found = isinstance(e, ClientError) and e.response['Error']['Code'] in ('404', 'NoSuchKey')
+                if not_found or attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                self.logger.warning(f"Error downloading {file_key}, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _temp_dir(self):
+        # Download workers fetch concurrently, the first one creates the directory
+        with self._temp_lock:
+            if self.temp_directory is None:
+                self.temp_directory = tempfile.mkdtemp(prefix='s3_ingest_')
+            return self.temp_directory
+
+    def _download_object(self, file_key):
+        local_path = os.path.join(self._temp_dir(), file_key)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        self.s3.download_file(self.source_bucket, file_key, local_path)
+        return local_path
+
+    def _read_object(self, file_key):
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold, dir=self._temp_dir())
         try:
-            self.s3.download_file(self.source_bucket, file_key, local_path)
-        except ClientError as e:
-            self.logger.error(f"Error downloading {file_key}: {e}")
-
-
-# processor = S3Storage('source-bucket-name', 'aws-access-key-id', 'aws-secret-access-key', 'region-name', batch_size=100, max_workers=10)
-# documents = processor.load_documents()
\ No newline at end of file
+            body = self.s3.get_object(Bucket=self.source_bucket, Key=file_key)['Body']
+            for chunk in body.iter_chunks(1024 * 1024):
+                buffer.write(chunk)
+        except Exception:
+            buffer.close()
+            raise
+        buffer.seek(0)
+        return buffer
+
+    def release(self, local_file):
+        # Drop each file once parsed so neither memory nor the temp directory holds the whole bucket
+        if not isinstance(local_file, str):
+            local_file.close()
+        elif os.path.exists(local_file):
+            os.remove(local_file)
+
+    def close(self):
+        if self.temp_directory is not None:
+            shutil.rmtree(self.temp_directory, ignore_errors=True)
+
+
+# processor = S3Storage('source-bucket-name', 'aws-access-key-id', 'aws-secret-access-key', 'region-name')
+# files = processor.list_files()
\ No newline at end of file
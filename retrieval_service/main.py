@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -6,7 +7,14 @@ import uvicorn
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Memory-map the local backend's snapshots before taking traffic
+    retrieval.warm_up()
+    yield
+
 app = FastAPI(
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redocs",
     title="Resource Service API",
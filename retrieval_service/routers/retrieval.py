@@ -1,60 +1,544 @@
 import os
 import re
+import time
+import asyncio
+import logging
+import json
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
 
 from retrieval_service.utils.authUtil import verify_token
 from retrieval_service.utils.roleCheckerUtil import RoleChecker
+from retrieval_service.utils.queryCacheUtil import QueryEmbeddingCache, CachedQueryEmbeddings, normalise_query
+from retrieval_service.utils.resultCacheUtil import SemanticResultCache
+from retrieval_service.utils.localVectorStoreUtil import LocalVectorStore
+from retrieval_service.utils.rerankUtil import LexicalReranker, CrossEncoderReranker
 
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_postgres import PGVector
+from sqlalchemy import Text, cast, create_engine, event, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 allowed_roles = RoleChecker(["admin", "user"])
 
+# collection name -> (monotonic time of the last check, index version)
+_collection_versions = {}
+
+# pgvector backend: collections seen in langchain_pg_collection. PGVector creates a missing
+# collection when it is opened, so a search only opens one after it was found here
+_known_collections = set()
+
+# Local backend: collection name -> loaded snapshot, and monotonic time of its last manifest check
+_snapshots = {}
+_snapshot_checks = {}
+
+# Reciprocal rank fusion constant, as in the original RRF paper
+RRF_K = 60
+
+# pgvector settings for the search running in the current task, e.g. {"hnsw.ef_search": 100}
+_ann_settings = contextvars.ContextVar("ann_settings", default=None)
+
+@event.listens_for(Session, "after_begin")
+def _apply_ann_settings(session, transaction, connection):
+    # PGVector opens its own sessions (sync or async), so the settings are applied as each one begins
+    settings = _ann_settings.get()
+    for name, value in (settings or {}).items():
+        connection.exec_driver_sql(f"SET LOCAL {name} = {int(value)}")
+
+class CollectionNotFound(LookupError):
+    pass
+
 router = APIRouter(
     tags=["Retrieval"],
     dependencies=[Depends(allowed_roles)]
 )
 
-class QueryModel(BaseModel):
+class SearchOptions(BaseModel):
+    # Search one collection, e.g. a study's tmf_{study_id}, instead of the default one
+    collection: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,62}$")
+    k: int = Field(3, ge=1, le=50)
+    # hybrid fuses the vector search with a Postgres full-text search
+    search_type: Literal["similarity", "mmr", "hybrid"] = "similarity"
+    # Minimum relevance score (1 - cosine distance), similarity search only
+    score_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # Candidates fetched per search for MMR and hybrid; MMR diversity (0 = most diverse, 1 = most relevant)
+    fetch_k: int = Field(20, ge=1, le=200)
+    lambda_mult: float = Field(0.5, ge=0.0, le=1.0)
+    # PGVector metadata filter, e.g. {"page": {"$lte": 3}} or {"source": {"$in": [...]}}
+    filter: Optional[Dict[str, Any]] = None
+    # Only chunks whose source starts with this path, e.g. /tmp/s3_temp/tmf/{study_id}/
+    source_prefix: Optional[str] = None
+    # Recall / latency knobs of the HNSW and IVFFlat indexes, server defaults when omitted
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+    probes: Optional[int] = Field(None, ge=1, le=32768)
+    # Rerank rerank_candidates hits and keep the best k with metadata["relevance_score"]; "none" overrides RETRIEVAL_RERANKER
+    rerank: Optional[Literal["none", "lexical", "cross_encoder"]] = None
+    rerank_candidates: int = Field(20, ge=1, le=200)
+
+    @model_validator(mode="after")
+    def check_search_type(self):
+        if self.score_threshold is not None and self.search_type != "similarity":
+            raise ValueError("score_threshold is only supported with similarity search")
+        return self
+
+    def search_filter(self):
+        if not self.source_prefix:
+            return self.filter
+        escaped = self.source_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        prefix_filter = {"source": {"$like": f"{escaped}%"}}
+        return {"$and": [self.filter, prefix_filter]} if self.filter else prefix_filter
+
+    def ann_settings(self):
+        settings = {
+            "hnsw.ef_search": self.ef_search or os.getenv("RETRIEVAL_HNSW_EF_SEARCH"),
+            "ivfflat.probes": self.probes or os.getenv("RETRIEVAL_IVFFLAT_PROBES"),
+        }
+        return {name: int(value) for name, value in settings.items() if value}
+
+    def reranker(self):
+        name = self.rerank or os.getenv("RETRIEVAL_RERANKER") or "none"
+        return None if name == "none" else name
+
+    def lexical(self):
+        # Literal query terms decide the results, not just the query vector
+        return self.search_type == "hybrid" or self.reranker() == "lexical"
+
+    def scope(self):
+        # Everything but the collection shapes the results, so it all goes into the result cache key
+        fields = set(SearchOptions.model_fields) - {"collection"}
+        return json.dumps(self.model_dump(include=fields), sort_keys=True, default=str)
+
+class QueryModel(SearchOptions):
     query: str
 
+class BatchQueryModel(SearchOptions):
+    queries: List[str] = Field(min_length=1, max_length=100)
+
+def _backend():
+    # "pgvector", or "local" to search collection snapshots in memory without Postgres
+    return os.getenv("RETRIEVAL_BACKEND", "pgvector")
+
+def _async_mode():
+    # "false" falls back to the sync driver, run on a bounded thread pool
+    return os.getenv("RETRIEVAL_ASYNC", "true").lower() == "true"
+
+def _async_url(url):
+    # psycopg2 has no asyncio support, psycopg 3 does
+    return re.sub(r"^postgresql(\+psycopg2)?://", "postgresql+psycopg://", url)
+
+@lru_cache(maxsize=1)
+def _get_engine(vectordb_url: str):
+    # One connection pool per process, shared by every collection
+    pool_args = {
+        "pool_size": int(os.getenv("RETRIEVAL_DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("RETRIEVAL_DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": True,
+    }
+    if _async_mode():
+        return create_async_engine(_async_url(vectordb_url), **pool_args)
+    return create_engine(vectordb_url, **pool_args)
+
 @lru_cache(maxsize=1)
-def _get_retriever():
+def _get_executor():
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("RETRIEVAL_WORKERS", "8")),
+        thread_name_prefix="retrieval"
+    )
+
+@lru_cache(maxsize=1)
+def _get_embeddings():
+    try:
+        embeddings = OpenAIEmbeddings()
+    except Exception as exc:
+        raise RuntimeError(f"Failed to initialise embeddings: {exc}") from exc
+
+    # Repeated questions skip the embedding round-trip; a size of 0 disables the cache
+    cache_size = int(os.getenv("RETRIEVAL_QUERY_CACHE_SIZE", "1024"))
+    if cache_size <= 0:
+        return embeddings
+    cache = QueryEmbeddingCache(
+        maxsize=cache_size,
+        ttl=float(os.getenv("RETRIEVAL_QUERY_CACHE_TTL", "3600")),
+        path=os.getenv("RETRIEVAL_QUERY_CACHE_PATH") or None
+    )
+    return CachedQueryEmbeddings(embeddings, cache)
+
+@lru_cache(maxsize=1)
+def _get_result_cache():
+    # Near-duplicate questions reuse the documents found for an earlier one; a size of 0 disables the cache
+    cache_size = int(os.getenv("RETRIEVAL_RESULT_CACHE_SIZE", "256"))
+    if cache_size <= 0:
+        return None
+    return SemanticResultCache(
+        maxsize=cache_size,
+        ttl=float(os.getenv("RETRIEVAL_RESULT_CACHE_TTL", "600")),
+        max_distance=float(os.getenv("RETRIEVAL_RESULT_CACHE_DISTANCE", "0.05"))
+    )
+
+@lru_cache(maxsize=2)
+def _get_reranker(name: str):
+    match name:
+        case 'lexical':
+            return LexicalReranker()
+        case 'cross_encoder':
+            return CrossEncoderReranker(
+                model=os.getenv("RETRIEVAL_RERANK_MODEL", "ms-marco-MiniLM-L-12-v2"),
+                cache_dir=os.getenv("RETRIEVAL_RERANK_CACHE_DIR", "/tmp/flashrank")
+            )
+        case _:
+            raise ValueError(f"Unsupported reranker: {name}")
+
+def _get_vectordb_url():
     vectordb_url = os.getenv("VECTORDB_URL")
     if not vectordb_url:
         raise RuntimeError("VECTORDB_URL is not configured")
+    return vectordb_url
 
-    match = re.search(r"[^/]+$", vectordb_url)
+def _default_collection_name():
+    # Named after the vector database, like the index service's default collection
+    name = os.getenv("RETRIEVAL_DEFAULT_COLLECTION")
+    if name:
+        return name
+
+    match = re.search(r"[^/]+$", _get_vectordb_url())
     if not match:
         raise RuntimeError("VECTORDB_URL must include a database name")
+    return match.group(0)
 
-    collection_name = match.group(0)
+def _snapshot_path(collection_name):
+    # One snapshot directory per collection, as exported by the index service
+    return os.path.join(os.getenv("RETRIEVAL_SNAPSHOT_DIR", "/data/snapshots"), collection_name)
 
+def _load_snapshot(collection_name, embeddings):
+    path = _snapshot_path(collection_name)
     try:
-        embeddings = OpenAIEmbeddings()
-    except Exception as exc:
-        raise RuntimeError(f"Failed to initialise embeddings: {exc}") from exc
+        return LocalVectorStore.load(path, embeddings, collection_name)
+    except FileNotFoundError as exc:
+        raise RuntimeError(f"No snapshot of {collection_name} in {path}") from exc
 
-    try:
-        vectorstore = PGVector(
-            embeddings,
-            collection_name=collection_name,
-            connection=vectordb_url
-        )
-    except Exception as exc:
-        raise RuntimeError(f"Failed to connect to vector store: {exc}") from exc
+@lru_cache(maxsize=16)
+def _get_retriever(collection_name: Optional[str] = None):
+    collection_name = collection_name or _default_collection_name()
+
+    embeddings = _get_embeddings()
+
+    match _backend():
+        case 'pgvector':
+            try:
+                vectorstore = PGVector(
+                    embeddings,
+                    collection_name=collection_name,
+                    connection=_get_engine(_get_vectordb_url()),
+                    async_mode=_async_mode()
+                )
+            except Exception as exc:
+                raise RuntimeError(f"Failed to connect to vector store: {exc}") from exc
+        case 'local':
+            if collection_name not in _snapshots:
+                _snapshots[collection_name] = _load_snapshot(collection_name, embeddings)
+            vectorstore = _snapshots[collection_name]
+        case backend:
+            raise RuntimeError(f"Unsupported retrieval backend: {backend}")
 
     return vectorstore.as_retriever(search_kwargs={"k": 3})
 
+async def _run_sync(func, *args, **kwargs):
+    # Run in a copy of the current context, so the worker thread sees _ann_settings
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+async def _embed_queries(embeddings, queries):
+    # Async mode embeds with the async OpenAI client and searches over the async engine, never blocking the loop
+    if _async_mode():
+        return await embeddings.aembed_documents(queries)
+    return await _run_sync(embeddings.embed_documents, queries)
+
+def _lexical_statement(vectorstore, query, options, limit):
+    store = vectorstore.EmbeddingStore
+    collection = vectorstore.CollectionStore
+    # Same configuration the index service built document_tsv with
+    config = os.getenv("RETRIEVAL_FTS_CONFIG", "english")
+    # Any query term may match (OR), the ranking rewards chunks that match more of them
+    tsquery = cast(func.replace(cast(func.plainto_tsquery(config, query), Text), "&", "|"), TSQUERY)
+    tsv = literal_column("langchain_pg_embedding.document_tsv")
+    rank = func.ts_rank_cd(tsv, tsquery)
+
+    statement = (
+        select(store.document, store.cmetadata)
+        .join(collection, store.collection_id == collection.uuid)
+        .where(collection.name == vectorstore.collection_name)
+        .where(tsv.op("@@")(tsquery))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    search_filter = options.search_filter()
+    if search_filter:
+        statement = statement.where(vectorstore._create_filter_clause(search_filter))
+    return statement
+
+async def _lexical_search(vectorstore, query, options, limit):
+    statement = _lexical_statement(vectorstore, query, options, limit)
+    engine = _get_engine(_get_vectordb_url())
+    if _async_mode():
+        async with AsyncSession(engine) as session:
+            rows = (await session.execute(statement)).all()
+    else:
+        def read():
+            with Session(engine) as session:
+                return session.execute(statement).all()
+        rows = await _run_sync(read)
+    return [Document(page_content=document, metadata=metadata or {}) for document, metadata in rows]
+
+def _reciprocal_rank_fusion(result_lists, k):
+    # Each list adds 1 / (RRF_K + rank) to a chunk's score, so chunks found by both searches rise to the top
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = (doc.page_content, json.dumps(doc.metadata, sort_keys=True, default=str))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+async def _rerank(reranker, query, documents, k):
+    # Scored on a worker thread: the cross-encoder keeps a CPU core busy, and BM25 tokenises every candidate
+    scores = await _run_sync(reranker.score, query, documents)
+    ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)[:k]
+    # Copies, the local backend hands out the Document objects of its snapshot
+    return [Document(page_content=doc.page_content, metadata={**doc.metadata, "relevance_score": score}) for doc, score in ranked]
+
+async def _search(vectorstore, query, vector, options):
+    # Each search runs in its own task, so this only applies to its sessions
+    _ann_settings.set(options.ann_settings())
+    name = options.reranker()
+    if name is None:
+        return await _vector_search(vectorstore, query, vector, options, options.k)
+    # Before the search, so a reranker that cannot load fails the request without searching
+    reranker = _get_reranker(name)
+    candidates = await _vector_search(vectorstore, query, vector, options, max(options.rerank_candidates, options.k))
+    return await _rerank(reranker, query, candidates, options.k)
+
+def _async_search(vectorstore):
+    # Local snapshots are searched with NumPy in this process, and a filter is a Python pass
+    # over every chunk's metadata, so they always run on the thread pool
+    return _async_mode() and not isinstance(vectorstore, LocalVectorStore)
+
+async def _vector_search(vectorstore, query, vector, options, k):
+    search_filter = options.search_filter()
+    if options.search_type == "hybrid":
+        if _backend() != "pgvector":
+            raise ValueError("Hybrid search needs the pgvector backend")
+        fetch_k = max(options.fetch_k, k)
+        if _async_search(vectorstore):
+            semantic_search = vectorstore.asimilarity_search_by_vector(vector, k=fetch_k, filter=search_filter)
+        else:
+            semantic_search = _run_sync(vectorstore.similarity_search_by_vector, vector, k=fetch_k, filter=search_filter)
+        # Both searches run concurrently, each on its own connection
+        semantic, lexical = await asyncio.gather(semantic_search, _lexical_search(vectorstore, query, options, fetch_k))
+        return _reciprocal_rank_fusion([semantic, lexical], k)
+
+    if options.search_type == "mmr":
+        kwargs = {"k": k, "fetch_k": max(options.fetch_k, k), "lambda_mult": options.lambda_mult, "filter": search_filter}
+        if _async_search(vectorstore):
+            return await vectorstore.amax_marginal_relevance_search_by_vector(vector, **kwargs)
+        return await _run_sync(vectorstore.max_marginal_relevance_search_by_vector, vector, **kwargs)
+
+    if options.score_threshold is None:
+        if _async_search(vectorstore):
+            return await vectorstore.asimilarity_search_by_vector(vector, k=k, filter=search_filter)
+        return await _run_sync(vectorstore.similarity_search_by_vector, vector, k=k, filter=search_filter)
+
+    # PGVector returns distances; convert them with the store's own relevance function
+    if _async_search(vectorstore):
+        scored = await vectorstore.asimilarity_search_with_score_by_vector(vector, k=k, filter=search_filter)
+    else:
+        scored = await _run_sync(vectorstore.similarity_search_with_score_by_vector, vector, k=k, filter=search_filter)
+    relevance = vectorstore._select_relevance_score_fn()
+    return [doc for doc, distance in scored if relevance(distance) >= options.score_threshold]
+
+async def _read_scalar(query, params):
+    engine = _get_engine(_get_vectordb_url())
+    if _async_mode():
+        async with engine.connect() as conn:
+            return (await conn.execute(query, params)).scalar()
+
+    def read():
+        with engine.connect() as conn:
+            return conn.execute(query, params).scalar()
+    return await _run_sync(read)
+
+async def _read_collection_version(collection_name):
+    query = text("SELECT version FROM index_collection_version WHERE collection_name = :name")
+    try:
+        return await _read_scalar(query, {"name": collection_name})
+    except Exception as e:
+        logger.warning(f"Could not read the index version of {collection_name}: {e}")
+        return None
+
+async def _refresh_result_cache(cache, collection_name):
+    # The index service bumps a collection's version after every run that changes it
+    interval = float(os.getenv("RETRIEVAL_RESULT_CACHE_CHECK_SECONDS", "5"))
+    now = time.monotonic()
+    checked = _collection_versions.get(collection_name)
+    if checked is not None and now - checked[0] < interval:
+        return
+
+    version = await _read_collection_version(collection_name)
+    if checked is not None and checked[1] != version:
+        logger.info(f"Collection {collection_name} was re-indexed, dropping its cached results")
+        cache.invalidate(collection_name)
+    _collection_versions[collection_name] = (now, version)
+
+async def _refresh_snapshot(collection_name, retriever):
+    # The index service swaps a new snapshot directory in after every export
+    vectorstore = retriever.vectorstore
+    name = vectorstore.collection_name
+    interval = float(os.getenv("RETRIEVAL_SNAPSHOT_CHECK_SECONDS", "30"))
+    now = time.monotonic()
+    checked = _snapshot_checks.get(name)
+    if checked is not None and now - checked < interval:
+        return retriever
+    _snapshot_checks[name] = now
+
+    try:
+        with open(os.path.join(_snapshot_path(name), "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        # Mid-swap or removed, keep serving the snapshot already loaded
+        return retriever
+    if (manifest.get("version"), manifest.get("created_on")) == (vectorstore.manifest.get("version"), vectorstore.manifest.get("created_on")):
+        return retriever
+
+    logger.info(f"New snapshot of {name} (version {manifest.get('version')}), reloading")
+    try:
+        _snapshots[name] = await _run_sync(_load_snapshot, name, _get_embeddings())
+    except Exception as e:
+        logger.warning(f"Could not load the new snapshot of {name}, keeping version {vectorstore.manifest.get('version')}: {e}")
+        return retriever
+    _get_retriever.cache_clear()
+    cache = _get_result_cache()
+    if cache is not None:
+        cache.invalidate(name)
+    return _get_retriever(collection_name)
+
+async def _check_collection(collection_name):
+    name = collection_name or _default_collection_name()
+    if name in _known_collections:
+        return
+    query = text("SELECT 1 FROM langchain_pg_collection WHERE name = :name")
+    if await _read_scalar(query, {"name": name}) is None:
+        raise CollectionNotFound(f"Collection {name} not found")
+    _known_collections.add(name)
+
+async def _current_retriever(collection_name=None):
+    if _backend() == "pgvector":
+        await _check_collection(collection_name)
+    retriever = _get_retriever(collection_name)
+    if _backend() == "local":
+        retriever = await _refresh_snapshot(collection_name, retriever)
+    return retriever
+
+def warm_up():
+    # Loads the local backend's snapshots at start-up rather than on the first request
+    if _backend() != "local":
+        return
+    names = [name.strip() for name in os.getenv("RETRIEVAL_PRELOAD_COLLECTIONS", "").split(",") if name.strip()]
+    for name in names or [None]:
+        try:
+            _get_retriever(name)
+        except Exception as e:
+            logger.error(f"Could not preload snapshot {name or _default_collection_name()}: {e}")
+
+def _cache_scope(vectorstore, options, query):
+    scope = (vectorstore.collection_name, options.scope())
+    # "SOP-QA-012" and "SOP-QA-013" embed alike but match different chunks lexically,
+    # so hybrid and lexically reranked results are only shared by the same query text
+    if options.lexical():
+        scope += (normalise_query(query),)
+    return scope
+
+async def _retrieve_batch(retriever, queries, options=None):
+    vectorstore = retriever.vectorstore
+    options = options or SearchOptions(k=retriever.search_kwargs.get("k", 3))
+    # Repeated queries are embedded and searched once, every distinct query in one embedding request
+    unique = list(dict.fromkeys(queries))
+    vectors = await _embed_queries(vectorstore.embeddings, unique)
+
+    results = [None] * len(unique)
+    cache = _get_result_cache()
+    scopes = [_cache_scope(vectorstore, options, query) for query in unique]
+    if cache is not None:
+        # The local backend drops a collection's results when it loads a new snapshot
+        if _backend() == "pgvector":
+            await _refresh_result_cache(cache, vectorstore.collection_name)
+        results = [cache.get(scope, vector) for scope, vector in zip(scopes, vectors)]
+
+    # Searches the cache could not answer run concurrently
+    missing = [i for i, documents in enumerate(results) if documents is None]
+    found = await asyncio.gather(*(_search(vectorstore, unique[i], vectors[i], options) for i in missing))
+    for i, documents in zip(missing, found):
+        results[i] = documents
+        if cache is not None:
+            cache.set(scopes[i], vectors[i], documents)
+
+    by_query = dict(zip(unique, results))
+    return [{"query": query, "documents": by_query[query]} for query in queries]
+
+async def _retrieve(retriever, query, options=None):
+    return (await _retrieve_batch(retriever, [query], options))[0]["documents"]
+
 @router.post("/retrieve", status_code=200)
 async def query_retriever(query_model: QueryModel):
     query = query_model.query
     try:
-        retriever = _get_retriever()
-        results = retriever.invoke(query)
+        retriever = await _current_retriever(query_model.collection)
+        results = await _retrieve(retriever, query, query_model)
         return results
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        # Raised by PGVector for filters it cannot translate
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/retrieve/batch", status_code=200)
+async def batch_query_retriever(batch: BatchQueryModel):
+    try:
+        retriever = await _current_retriever(batch.collection)
+        return await _retrieve_batch(retriever, batch.queries, batch)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache/stats", status_code=200)
+async def cache_stats():
+    try:
+        embeddings = _get_embeddings()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    stats = {"query_embeddings": {"enabled": False}, "results": {"enabled": False}}
+    if isinstance(embeddings, CachedQueryEmbeddings):
+        stats["query_embeddings"] = {"enabled": True, **embeddings.cache.stats()}
+    result_cache = _get_result_cache()
+    if result_cache is not None:
+        stats["results"] = {"enabled": True, **result_cache.stats()}
+    return stats
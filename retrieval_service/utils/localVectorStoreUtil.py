@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def _like(pattern, value, flags=0):
+    # SQL LIKE: % and _ are wildcards unless escaped with a backslash
+    regex = "".join(
+        ".*" if token == "%" else "." if token == "_" else re.escape(token[-1])
+        for token in re.findall(r"\\.|%|_|[^\\%_]", pattern)
+    )
+    return isinstance(value, str) and re.fullmatch(regex, value, flags | re.DOTALL) is not None
+
+
+OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$between": lambda value, operand: value is not None and operand[0] <= value <= operand[1],
+    "$exists": lambda value, operand: (value is not None) == bool(operand),
+    "$like": lambda value, operand: _like(operand, value),
+    "$ilike": lambda value, operand: _like(operand, value, re.IGNORECASE),
+}
+
+
+def matches_filter(metadata, filter):
+    """Evaluates a PGVector-style metadata filter against one chunk's metadata."""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator not in OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not OPERATORS[operator](metadata.get(key), operand):
+                    return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only, in-process vector store over a collection snapshot exported by the index service.
+
+    A snapshot directory holds:
+        manifest.json    format, collection, count, dimensions, dtype and index version
+        vectors.npy      unit-length embeddings, one row per chunk (float32 or float16)
+        documents.jsonl  {"id", "document", "metadata"} per row, in matrix order
+
+    float32 matrices are memory-mapped, so the OS page cache holds them and
+    start-up only reads the sidecar. float16 matrices are widened to float32 on
+    load, since NumPy has no fast float16 matrix product. Scores are cosine
+    similarities from one matrix-vector product; top-k uses argpartition.
+    Searches cost O(N) per query, plus a Python pass over the metadata when
+    filtered, so the retrieval service runs them on its thread pool.
+    """
+
+    def __init__(self, embeddings, vectors, documents, manifest, collection_name):
+        self._embeddings = embeddings
+        self.vectors = vectors
+        self.documents = documents
+        self.manifest = manifest
+        self.collection_name = collection_name
+
+    @classmethod
+    def load(cls, path, embeddings, collection_name=None):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        if vectors.dtype != np.float32:
+            vectors = np.asarray(vectors, dtype=np.float32)
+
+        documents = []
+        with open(os.path.join(path, "documents.jsonl")) as f:
+            for line in f:
+                row = json.loads(line)
+                documents.append(Document(page_content=row["document"], metadata=row.get("metadata") or {}))
+        if len(documents) != vectors.shape[0]:
+            raise ValueError(f"Snapshot {path} has {vectors.shape[0]} vectors but {len(documents)} documents")
+
+        logger.info(f"Loaded snapshot of {manifest.get('collection')} with {len(documents)} chunks from {path}")
+        return cls(embeddings, vectors, documents, manifest, collection_name or manifest.get("collection"))
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def _scores(self, embedding, filter=None):
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.vectors @ (query / norm if norm else query)
+        if filter:
+            mask = np.fromiter((matches_filter(doc.metadata, filter) for doc in self.documents), dtype=bool, count=len(self.documents))
+            scores = np.where(mask, scores, -np.inf)
+        return scores
+
+    @staticmethod
+    def _top_k(scores, k):
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        scores = self._scores(embedding, filter)
+        # Cosine distance, like PGVector returns
+        return [(self.documents[i], float(1.0 - scores[i])) for i in self._top_k(scores, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        candidates = self._top_k(self._scores(embedding, filter), fetch_k)
+        if len(candidates) == 0:
+            return []
+        selected = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32), self.vectors[candidates], lambda_mult=lambda_mult, k=k
+        )
+        return [self.documents[candidates[i]] for i in selected]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k, filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Snapshots are read-only, re-export the collection from the index service")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Load a snapshot with LocalVectorStore.load")
@@ -0,0 +1,242 @@
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalise_query(text):
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings whose entries expire after `ttl` seconds.
+
+    With `path` set, entries are also kept in a SQLite file, so every worker
+    process on the host shares what one of them has embedded. SQLite waits up
+    to 5 s for another worker's write lock, so the async methods reach the file
+    from a worker thread. Every `PRUNE_EVERY` writes a background thread trims
+    it to `maxsize` live entries.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, maxsize=1024, ttl=3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._writes = 0
+        self._pruning = False
+
+        self.conn = None
+        # Serialises the shared connection, apart from the in-memory lock the event loop takes
+        self.conn_lock = threading.Lock()
+        if path:
+            self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\n{normalise_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        vector = self._local_get(key)
+        if vector is None:
+            vector = self._shared_get(key)
+        return vector
+
+    async def aget(self, key):
+        vector = self._local_get(key)
+        if vector is None:
+            vector = await self._off_loop(self._shared_get, key)
+        return vector
+
+    def set(self, key, vector):
+        vector = list(vector)
+        with self.lock:
+            self._remember(key, vector, time.monotonic())
+        self._shared_set(key, vector)
+
+    async def aset(self, key, vector):
+        vector = list(vector)
+        with self.lock:
+            self._remember(key, vector, time.monotonic())
+        await self._off_loop(self._shared_set, key, vector)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_hits": self.shared_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "shared": self.conn is not None,
+            }
+
+    async def _off_loop(self, func, *args):
+        if self.conn is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def _local_get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)
+            return None
+
+    def _remember(self, key, vector, now):
+        self.entries[key] = (now + self.ttl, vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _shared_get(self, key):
+        vector = None
+        if self.conn is not None:
+            try:
+                # Wall clock, since monotonic time is not comparable across processes
+                with self.conn_lock:
+                    row = self.conn.execute(
+                        "SELECT vector FROM query_embeddings WHERE key = ? AND expires_at > ?", (key, time.time())
+                    ).fetchone()
+                vector = array("d", row[0]).tolist() if row else None
+            except sqlite3.Error as e:
+                logger.warning(f"Query embedding cache read failed: {e}")
+
+        with self.lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.shared_hits += 1
+            self._remember(key, vector, time.monotonic())
+        return vector
+
+    def _shared_set(self, key, vector):
+        if self.conn is None:
+            return
+        try:
+            with self.conn_lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                    (key, array("d", vector).tobytes(), time.time() + self.ttl)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Query embedding cache write failed: {e}")
+            return
+
+        with self.lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0 and not self._pruning
+            self._pruning = self._pruning or prune
+        if prune:
+            threading.Thread(target=self.prune, name="query-cache-prune", daemon=True).start()
+
+    def prune(self):
+        """Drops expired entries and the oldest beyond `maxsize` from the shared file."""
+        try:
+            # Its own connection, so lookups do not queue behind the deletes
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            try:
+                conn.execute("DELETE FROM query_embeddings WHERE expires_at <= ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM query_embeddings WHERE key NOT IN "
+                    "(SELECT key FROM query_embeddings ORDER BY expires_at DESC LIMIT ?)",
+                    (self.maxsize,)
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Query embedding cache prune failed: {e}")
+        finally:
+            with self.lock:
+                self._pruning = False
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings that answer repeated queries from a `QueryEmbeddingCache`.
+
+    The retrieval service only ever embeds queries, so `embed_documents` (used
+    for batches of queries) goes through the cache as well and sends only the
+    misses to the wrapped model, in one request.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+    def _lookup(self, texts):
+        keys = [self.cache.key(self.model, text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        return keys, vectors, missing
+
+    def _store(self, keys, vectors, missing, embedded):
+        for i, vector in zip(missing, embedded):
+            self.cache.set(keys[i], vector)
+            vectors[i] = list(vector)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+            self._store(keys, vectors, missing, embedded)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.key(self.model, text) for text in texts]
+        vectors = [await self.cache.aget(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = await self.embeddings.aembed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                await self.cache.aset(keys[i], vector)
+                vectors[i] = list(vector)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache.key(self.model, text)
+        vector = await self.cache.aget(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            await self.cache.aset(key, vector)
+        return vector
@@ -0,0 +1,103 @@
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticResultCache:
+    """
+    Caches search results by query vector, per search scope.
+
+    A scope is the collection plus whatever else shapes the results (k, filters).
+    A lookup returns the documents of the closest cached query in the scope when
+    its cosine distance is at most `max_distance`. The cache keeps its `maxsize`
+    most recently used entries across all scopes, for `ttl` seconds at most, and
+    drops a scope once its last entry goes.
+    """
+
+    def __init__(self, maxsize=256, ttl=600, max_distance=0.05):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        # scope -> OrderedDict of entry id -> (expires_at, unit vector, documents)
+        self.scopes = {}
+        # entry id -> scope, least recently used first
+        self.order = OrderedDict()
+        self.lock = threading.Lock()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope, vector):
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self.lock:
+            entries = self.scopes.get(scope)
+            if entries:
+                for entry_id in [i for i, (expires_at, _, _) in entries.items() if expires_at <= now]:
+                    self._drop(entry_id)
+                entries = self.scopes.get(scope)
+            if not entries:
+                self.misses += 1
+                return None
+
+            ids = list(entries)
+            matrix = np.stack([entries[i][1] for i in ids])
+            distances = 1.0 - matrix @ query
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(ids[best])
+            self.order.move_to_end(ids[best])
+            self.hits += 1
+            return entries[ids[best]][2]
+
+    def set(self, scope, vector, documents):
+        with self.lock:
+            entries = self.scopes.setdefault(scope, OrderedDict())
+            entries[self._next_id] = (time.monotonic() + self.ttl, self._unit(vector), documents)
+            self.order[self._next_id] = scope
+            self._next_id += 1
+            # Scopes come from request options, so only a cap over all of them bounds memory
+            while len(self.order) > self.maxsize:
+                self._drop(next(iter(self.order)))
+
+    def _drop(self, entry_id):
+        scope = self.order.pop(entry_id)
+        entries = self.scopes[scope]
+        del entries[entry_id]
+        if not entries:
+            del self.scopes[scope]
+
+    def invalidate(self, collection=None):
+        # Scopes are tuples that start with the collection name
+        with self.lock:
+            for scope in [s for s in self.scopes if collection is None or s[0] == collection]:
+                for entry_id in self.scopes.pop(scope):
+                    del self.order[entry_id]
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "scopes": len(self.scopes),
+                "size": len(self.order),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "max_distance": self.max_distance,
+            }
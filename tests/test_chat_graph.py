@@ -0,0 +1,230 @@
+import json
+import time
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from chat_service.chains.router import RouteQuery
+
+
+graph = importlib.import_module("chat_service.graph")
+retrieve = importlib.import_module("chat_service.nodes.retrieve")
+grade_documents = importlib.import_module("chat_service.nodes.grade_documents")
+generate = importlib.import_module("chat_service.nodes.generate")
+
+
+def slow(result, delay=0.05):
+    # Stands in for an LLM round-trip that only awaits
+    async def run(inputs):
+        await asyncio.sleep(delay)
+        return result
+
+    return RunnableLambda(run)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_chats_share_the_event_loop(monkeypatch):
+    async def query_retriever(query):
+        await asyncio.sleep(0.05)
+        return [{"page_content": "TMF filing SOP", "metadata": {"source": "sop.pdf"}}]
+
+    monkeypatch.setattr(graph, "question_router", slow(RouteQuery(datasource="vectorstore")))
+    monkeypatch.setattr(graph, "hallucination_grader", slow(SimpleNamespace(binary_score=True)))
+    monkeypatch.setattr(graph, "answer_grader", slow(SimpleNamespace(binary_score=True)))
+    monkeypatch.setattr(retrieve, "query_retriever", query_retriever)
+    monkeypatch.setattr(grade_documents, "retrieval_grader", slow(SimpleNamespace(binary_score="yes")))
+    monkeypatch.setattr(generate, "generation_chain", slow("A TMF is a trial master file."))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(graph.graph.ainvoke({"question": f"What is TMF {i}?"}) for i in range(30)))
+    elapsed = time.perf_counter() - start
+
+    assert [r["generation"] for r in results] == ["A TMF is a trial master file."] * 30
+    # Six 50 ms calls per chat; 30 chats run one after another would take 9 s
+    assert elapsed < 3.0
+
+
+speculative_route = importlib.import_module("chat_service.nodes.speculative_route")
+
+
+@pytest.mark.asyncio
+async def test_speculative_route_retrieves_while_routing(monkeypatch):
+    calls = {"started": 0, "cancelled": 0}
+
+    async def query_retriever(query):
+        calls["started"] += 1
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        return [{"page_content": "TMF filing SOP", "metadata": {}}]
+
+    monkeypatch.setattr(retrieve, "query_retriever", query_retriever)
+    state = {"question": "What is TMF?"}
+
+    monkeypatch.setattr(speculative_route, "question_router", slow(RouteQuery(datasource="vectorstore"), delay=0.2))
+    start = time.perf_counter()
+    result = await speculative_route.speculative_route(state)
+    # Router and retrieval overlap instead of taking 0.4 s back to back
+    assert time.perf_counter() - start < 0.35
+    assert result["datasource"] == "retrieve"
+    assert [d.page_content for d in result["documents"]] == ["TMF filing SOP"]
+
+    monkeypatch.setattr(speculative_route, "question_router", slow(RouteQuery(datasource="websearch"), delay=0.05))
+    result = await speculative_route.speculative_route(state)
+    await asyncio.sleep(0)
+    assert result == {"question": "What is TMF?", "datasource": "websearch"}
+    assert calls == {"started": 2, "cancelled": 1}
+
+
+@pytest.fixture
+def speculative_graph(monkeypatch):
+    monkeypatch.setenv("CHAT_SPECULATIVE_RETRIEVAL", "true")
+    yield importlib.reload(graph)
+    monkeypatch.delenv("CHAT_SPECULATIVE_RETRIEVAL")
+    importlib.reload(graph)
+
+
+@pytest.mark.asyncio
+async def test_speculative_graph_grades_the_prefetched_documents(monkeypatch, speculative_graph):
+    async def query_retriever(query):
+        return [{"page_content": "TMF filing SOP", "metadata": {}}]
+
+    monkeypatch.setattr(speculative_route, "question_router", slow(RouteQuery(datasource="vectorstore")))
+    monkeypatch.setattr(retrieve, "query_retriever", query_retriever)
+    monkeypatch.setattr(speculative_graph, "hallucination_grader", slow(SimpleNamespace(binary_score=True)))
+    monkeypatch.setattr(speculative_graph, "answer_grader", slow(SimpleNamespace(binary_score=True)))
+    monkeypatch.setattr(grade_documents, "retrieval_grader", slow(SimpleNamespace(binary_score="yes")))
+    monkeypatch.setattr(generate, "generation_chain", slow("A TMF is a trial master file."))
+
+    result = await speculative_graph.graph.ainvoke({"question": "What is TMF?"})
+
+    assert "retrieve" not in speculative_graph.graph.nodes
+    assert [d.page_content for d in result["documents"]] == ["TMF filing SOP"]
+    assert result["generation"] == "A TMF is a trial master file."
+
+
+def patch_rejecting_chat(monkeypatch):
+    # Every generation is graded as not grounded, so the graph keeps retrying
+
+    async def query_retriever(query):
+        return [{"page_content": "TMF filing SOP", "metadata": {}}]
+
+    monkeypatch.setattr(graph, "question_router", slow(RouteQuery(datasource="vectorstore"), delay=0))
+    monkeypatch.setattr(graph, "hallucination_grader", slow(SimpleNamespace(binary_score=False), delay=0))
+    monkeypatch.setattr(retrieve, "query_retriever", query_retriever)
+    monkeypatch.setattr(grade_documents, "retrieval_grader", slow(SimpleNamespace(binary_score="yes"), delay=0))
+    monkeypatch.setattr(generate, "generation_chain", slow("Unsupported draft", delay=0))
+
+
+@pytest.mark.asyncio
+async def test_rejected_generations_stop_at_the_retry_budget(monkeypatch):
+    patch_rejecting_chat(monkeypatch)
+    monkeypatch.setattr(graph, "CHAT_MAX_GENERATIONS", 3)
+
+    result = await graph.graph.ainvoke({"question": "What is TMF?"})
+
+    assert result["iterations"] == 3
+    assert result["budget_exhausted"] is True
+    assert result["generation"] == importlib.import_module("chat_service.nodes.fallback").CHAT_FALLBACK_ANSWER
+    assert result["tokens_used"] > 0
+
+    # A chat that already used its time gets one attempt
+    monkeypatch.setattr(graph, "CHAT_TIME_BUDGET_SECONDS", 5)
+    result = await graph.graph.ainvoke({"question": "What is TMF?", "started_at": time.monotonic() - 10})
+    assert result["iterations"] == 1
+    assert result["budget_exhausted"] is True
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_reports_retry_accounting(monkeypatch):
+    main = importlib.import_module("chat_service.main")
+    patch_rejecting_chat(monkeypatch)
+    monkeypatch.setattr(graph, "CHAT_MAX_GENERATIONS", 2)
+
+    response = await main.chat_endpoint(main.ChatRequest(question="What is TMF?", stream=False))
+    assert response["iterations"] == 2
+    assert response["budget_exhausted"] is True
+
+    # The streamed answer ends with the fallback, which no chat model produces
+    chunks = [chunk async for chunk in main.generate_response({"question": "What is TMF?"})]
+    assert chunks == ["Unsupported draft", "Unsupported draft", response["answer"]]
+
+
+def patch_second_draft_accepted(monkeypatch):
+    # The first draft is graded as not grounded, the second one passes
+    from langchain_core.language_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+
+    async def query_retriever(query):
+        return [{"page_content": "TMF filing SOP", "metadata": {"source": "sop.pdf"}}] * 2
+
+    grades = iter([False, True])
+    monkeypatch.setattr(graph, "question_router", slow(RouteQuery(datasource="vectorstore"), delay=0))
+    monkeypatch.setattr(graph, "hallucination_grader", RunnableLambda(lambda inputs: SimpleNamespace(binary_score=next(grades))))
+    monkeypatch.setattr(graph, "answer_grader", slow(SimpleNamespace(binary_score=True), delay=0))
+    monkeypatch.setattr(retrieve, "query_retriever", query_retriever)
+    monkeypatch.setattr(grade_documents, "retrieval_grader", slow(SimpleNamespace(binary_score="yes"), delay=0))
+    model = FakeListChatModel(responses=["Rejected draft", "Accepted answer"])
+    chain = RunnableLambda(lambda inputs: inputs["question"]) | model | StrOutputParser()
+    monkeypatch.setattr(generate, "generation_chain", chain)
+
+
+async def sse_events(main, mode):
+    events = []
+    async for message in main.generate_response({"question": "What is TMF?"}, "sse", mode):
+        event, data = message.strip().split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_buffered_stream_sends_only_the_accepted_answer(monkeypatch):
+    main = importlib.import_module("chat_service.main")
+    patch_second_draft_accepted(monkeypatch)
+
+    events = await sse_events(main, "buffered")
+    names = [event for event, _ in events]
+    assert names.count("token") == 1
+    assert "retract" not in names
+    assert ("token", {"text": "Accepted answer", "attempt": 2}) in events
+    assert [data["attempt"] for event, data in events if event == "status" and data["node"] == "generate"] == [1, 2]
+    assert events[-2] == ("sources", [{"source": "sop.pdf"}])
+    assert events[-1] == ("done", {"iterations": 2, "tokens_used": events[-1][1]["tokens_used"], "budget_exhausted": False})
+
+    # Plain text streams every attempt's tokens as they are generated
+    patch_second_draft_accepted(monkeypatch)
+    chunks = [chunk async for chunk in main.generate_response({"question": "What is TMF?"})]
+    assert len(chunks) > 2
+    assert "".join(chunks) == "Rejected draftAccepted answer"
+
+
+@pytest.mark.asyncio
+async def test_speculative_stream_retracts_the_rejected_draft(monkeypatch):
+    main = importlib.import_module("chat_service.main")
+    patch_second_draft_accepted(monkeypatch)
+
+    events = await sse_events(main, "speculative")
+    answer = {}
+    for event, data in events:
+        if event == "token":
+            answer[data["attempt"]] = answer.get(data["attempt"], "") + data["text"]
+        elif event == "retract":
+            assert answer.pop(data["attempt"]) == "Rejected draft"
+    assert answer == {2: "Accepted answer"}
+    assert [data for event, data in events if event == "retract"] == [{"attempt": 1}]
+    assert events[-1][0] == "done"
+
+
+@pytest.mark.asyncio
+async def test_stream_errors_arrive_as_events(monkeypatch):
+    main = importlib.import_module("chat_service.main")
+    patch_second_draft_accepted(monkeypatch)
+    monkeypatch.setattr(graph, "question_router", RunnableLambda(lambda inputs: 1 / 0))
+
+    events = await sse_events(main, "speculative")
+    assert events[-1] == ("error", {"detail": "division by zero"})
@@ -0,0 +1,98 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from langchain.schema import Document
+from langchain_core.runnables import RunnableLambda
+
+from chat_service.state import GraphState
+
+
+grade_documents = importlib.import_module("chat_service.nodes.grade_documents")
+
+
+class FailingGrader:
+    def invoke(self, inputs):
+        raise AssertionError("the LLM grader should not run")
+
+
+def make_grader(delays):
+    # Grades documents mentioning TMF as relevant, after the delay given per document
+    stats = {"in_flight": 0, "max_in_flight": 0, "finished": []}
+
+    async def grade(inputs):
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(delays[inputs["document"]])
+        finally:
+            stats["in_flight"] -= 1
+        stats["finished"].append(inputs["document"])
+        return SimpleNamespace(binary_score="yes" if "TMF" in inputs["document"] else "no")
+
+    return RunnableLambda(grade), stats
+
+
+def make_state(texts) -> GraphState:
+    return {
+        "question": "What is TMF?",
+        "generation": "",
+        "web_search": False,
+        "documents": [Document(page_content=text) for text in texts],
+    }
+
+
+@pytest.mark.asyncio
+async def test_grade_documents_trusts_rerank_scores(monkeypatch):
+    monkeypatch.setattr(grade_documents, "CHAT_RERANK_MIN_SCORE", "0.5")
+    monkeypatch.setattr(grade_documents, "retrieval_grader", FailingGrader())
+    state: GraphState = {
+        "question": "What is TMF?",
+        "generation": "",
+        "web_search": False,
+        "documents": [
+            Document(page_content="TMF filing SOP", metadata={"relevance_score": 0.9}),
+            Document(page_content="Monitoring plan", metadata={"relevance_score": 0.1}),
+        ],
+    }
+
+    result = await grade_documents.grade_documents(state)
+
+    assert [d.page_content for d in result["documents"]] == ["TMF filing SOP"]
+    assert result["web_search"] is False
+
+    state["documents"] = state["documents"][1:]
+    result = await grade_documents.grade_documents(state)
+    assert result["documents"] == []
+    assert result["web_search"] is True
+
+
+@pytest.mark.asyncio
+async def test_grade_documents_grades_concurrently_in_order(monkeypatch):
+    delays = {"TMF index": 0.05, "Lunch menu": 0.01, "TMF plan": 0.02, "Parking": 0.0}
+    grader, stats = make_grader(delays)
+    monkeypatch.setattr(grade_documents, "retrieval_grader", grader)
+    monkeypatch.setattr(grade_documents, "CHAT_GRADE_CONCURRENCY", 2)
+
+    result = await grade_documents.grade_documents(make_state(delays))
+
+    assert [d.page_content for d in result["documents"]] == ["TMF index", "TMF plan"]
+    assert result["web_search"] is False
+    assert stats["max_in_flight"] == 2
+
+
+@pytest.mark.asyncio
+async def test_grade_documents_early_exit_stops_at_enough_relevant(monkeypatch):
+    delays = {"TMF index": 0.5, "Lunch menu": 0.0, "TMF plan": 0.01, "Parking": 0.5}
+    grader, stats = make_grader(delays)
+    monkeypatch.setattr(grade_documents, "retrieval_grader", grader)
+    monkeypatch.setattr(grade_documents, "CHAT_GRADE_CONCURRENCY", 4)
+    monkeypatch.setattr(grade_documents, "CHAT_GRADE_EARLY_EXIT", 1)
+
+    result = await grade_documents.grade_documents(make_state(delays))
+
+    assert [d.page_content for d in result["documents"]] == ["TMF plan"]
+    assert stats["finished"] == ["Lunch menu", "TMF plan"]
+    # The cancelled grader calls have wound down by the time the node returns
+    assert stats["in_flight"] == 0
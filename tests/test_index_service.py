@@ -0,0 +1,533 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+import sqlalchemy
+from botocore.exceptions import ClientError
+
+from langchain.schema import Document
+from langchain.indexes import SQLRecordManager
+from langchain_core.vectorstores import VectorStore
+
+from index_service.benchmarks import chunking as benchmark_chunking
+from index_service.services import chunking, embedding, indexing, jobs, pipeline
+from index_service.utils import annIndexUtil, embeddingCacheUtil, snapshotUtil, storageS3Util
+
+
+def make_pdf(text):
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+class DummyStorage:
+    def __init__(self, files):
+        self.files = files
+        self.released = []
+
+    def list_files(self):
+        yield from self.files
+
+    def source_id(self, file):
+        return f"/tmp/{file}"
+
+    def fetch(self, file):
+        return f"/tmp/{file}"
+
+    def release(self, local_path):
+        self.released.append(local_path)
+
+    def close(self):
+        pass
+
+
+class DummyListing:
+    def __init__(self, storage, files):
+        self.storage = storage
+        self.files = files
+
+    def list_files(self):
+        yield from self.files
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class DummySplitter:
+    def split_documents(self, documents):
+        return [Document(page_content=part, metadata=doc.metadata) for doc in documents for part in doc.page_content.split()]
+
+
+def test_pipeline_streams_chunks_for_every_file(monkeypatch):
+    monkeypatch.setattr(
+        pipeline, "parse_pdf", lambda path: [Document(page_content="a b", metadata={"source": path, "page": 0})]
+    )
+    storage = DummyStorage([f"{i}.pdf" for i in range(20)])
+
+    chunks = list(pipeline.IngestPipeline(storage, DummySplitter(), queue_size=2, download_workers=3))
+
+    assert len(chunks) == 40
+    assert {c.metadata["source"] for c in chunks} == {f"/tmp/{i}.pdf" for i in range(20)}
+    assert sorted(storage.released) == sorted(f"/tmp/{i}.pdf" for i in range(20))
+
+
+def test_pipeline_skips_files_that_fail_to_parse(monkeypatch):
+    def parse(path):
+        if path.endswith("a.pdf"):
+            raise ValueError("bad pdf")
+        return [Document(page_content="b c", metadata={"source": path, "page": 0})]
+
+    monkeypatch.setattr(pipeline, "parse_pdf", parse)
+    storage = DummyStorage(["a.pdf", "b.pdf"])
+    ingest = pipeline.IngestPipeline(storage, DummySplitter(), queue_size=1)
+
+    assert [c.page_content for c in ingest] == ["b", "c"]
+    assert ingest.failed == [("a.pdf", "bad pdf")]
+    assert ingest.completed == ["b.pdf"]
+    assert ingest.stats["files_failed"] == 1
+    assert sorted(storage.released) == ["/tmp/a.pdf", "/tmp/b.pdf"]
+
+
+def test_pipeline_raises_stage_errors():
+    class BrokenListing(DummyStorage):
+        def list_files(self):
+            raise ValueError("bucket gone")
+            yield
+
+    with pytest.raises(ValueError):
+        list(pipeline.IngestPipeline(BrokenListing([]), DummySplitter(), queue_size=1))
+
+
+class DummyManifest:
+    def __init__(self):
+        self.entries = {}
+
+    def load(self):
+        return dict(self.entries)
+
+    def update(self, entries):
+        self.entries.update(entries)
+
+    def delete(self, file_ids):
+        for file_id in file_ids:
+            self.entries.pop(file_id, None)
+
+
+class DummyCollectionVersions:
+    def __init__(self):
+        self.versions = {}
+
+    def bump(self, collection_name):
+        self.versions[collection_name] = self.versions.get(collection_name, 0) + 1
+
+
+class DummyVectorStore(VectorStore):
+    def __init__(self):
+        self.docs = {}
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        for text, metadata, uid in zip(texts, metadatas, ids):
+            self.docs[uid] = Document(page_content=text, metadata=metadata)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        for uid in ids:
+            self.docs.pop(uid, None)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return []
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError
+
+
+def open_dummy_collection(name):
+    record_manager = SQLRecordManager(name, db_url="sqlite:///:memory:")
+    record_manager.create_schema()
+    return indexing.IndexCollection(name, name, record_manager, DummyManifest(), DummyVectorStore())
+
+
+def make_index_service():
+    service = indexing.IndexService.__new__(indexing.IndexService)
+    service.VECTORDB_NAME = "vector"
+    service.collections = {}
+    service.collections_lock = threading.Lock()
+    service._open_collection = open_dummy_collection
+    service.collection_versions = DummyCollectionVersions()
+    service.embedder = None
+    service.INDEX_QUEUE_SIZE = 2
+    service.INDEX_DOWNLOAD_WORKERS = 2
+    service.INDEX_PARSE_PROCESSES = 0
+    service.INDEX_BATCH_SIZE = 10
+    service.INDEX_WRITE_MODE = "insert"
+    service.INDEX_SNAPSHOT_ON_INDEX = False
+    return service
+
+
+def write_pdfs(tmp_path, monkeypatch, names):
+    monkeypatch.setattr(indexing, "get_text_splitter", lambda strategy: DummySplitter())
+    monkeypatch.setattr(
+        pipeline, "parse_pdf", lambda path: [Document(page_content=open(path).read(), metadata={"source": path, "page": 0})]
+    )
+    for name in names:
+        (tmp_path / f"{name}.pdf").write_text(f"content of {name}")
+
+
+def test_incremental_index_skips_unchanged_and_drops_removed_files(tmp_path, monkeypatch):
+    write_pdfs(tmp_path, monkeypatch, ["a", "b"])
+    service = make_index_service()
+
+    first = service.all(str(tmp_path), "local", incremental=True)
+    assert first["num_added"] == 6
+
+    (tmp_path / "b.pdf").unlink()
+    result = service.all(str(tmp_path), "local", incremental=True)
+
+    assert result["num_files_skipped"] == 1
+    assert result["num_added"] == 0
+    assert result["num_deleted"] == 3
+    assert {d.metadata["source"] for d in service.collection().vectorstore.docs.values()} == {str(tmp_path / "a.pdf")}
+    assert list(service.collection().manifest.entries) == [str(tmp_path / "a.pdf")]
+    assert service.collection_versions.versions == {"vector": 2}
+
+    # Nothing changed, so cached retrieval results stay valid
+    service.all(str(tmp_path), "local", incremental=True)
+    assert service.collection_versions.versions == {"vector": 2}
+
+
+def test_study_runs_index_into_their_own_collections(tmp_path, monkeypatch):
+    for study in ("S1", "S2"):
+        (tmp_path / "tmf" / study).mkdir(parents=True)
+        write_pdfs(tmp_path / "tmf" / study, monkeypatch, [f"{study}-protocol"])
+    service = make_index_service()
+
+    service.all(str(tmp_path), "local", study_id="S1")
+    result = service.all(str(tmp_path), "local", study_id="S2")
+    # A full run on S2 only cleans up its own collection
+    rerun = service.all(str(tmp_path), "local", study_id="S2")
+
+    assert result["collection"] == "tmf_S2"
+    assert rerun["num_deleted"] == 0
+    assert len(service.collection("tmf_S1").vectorstore.docs) == 3
+    assert {d.page_content for d in service.collection("tmf_S2").vectorstore.docs.values()} == {"content", "of", "S2-protocol"}
+    assert service.collection().vectorstore.docs == {}
+    with pytest.raises(ValueError):
+        service.collection("../other")
+
+
+class SharedTableVectorStore(DummyVectorStore):
+    """One collection of an embedding table whose ids are unique across all collections, like PGVector's."""
+
+    def __init__(self, rows, name):
+        self.rows = rows
+        self.name = name
+
+    @property
+    def docs(self):
+        return {uid: doc for uid, (name, doc) in self.rows.items() if name == self.name}
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        for text, metadata, uid in zip(texts, metadatas, ids):
+            name, _ = self.rows.get(uid, (self.name, None))
+            if name == self.name:
+                self.rows[uid] = (name, Document(page_content=text, metadata=metadata))
+        return ids
+
+    def delete(self, ids=None, collection_only=False, **kwargs):
+        for uid in ids:
+            if uid in self.rows and (not collection_only or self.rows[uid][0] == self.name):
+                del self.rows[uid]
+
+
+def test_collections_sharing_one_table_keep_their_own_chunks(tmp_path, monkeypatch):
+    write_pdfs(tmp_path, monkeypatch, ["a"])
+    service = make_index_service()
+    rows = {}
+
+    def open_shared_collection(name):
+        collection = open_dummy_collection(name)
+        collection.vectorstore = SharedTableVectorStore(rows, name)
+        return collection
+
+    service._open_collection = open_shared_collection
+
+    service.all(str(tmp_path), "local")
+    service.all(str(tmp_path), "local", collection="tmf_S1")
+    assert len(rows) == 6
+    assert len(service.collection("tmf_S1").vectorstore.docs) == 3
+
+    # Re-indexing the default collection with new content leaves the study's chunks alone
+    (tmp_path / "a.pdf").write_text("rewritten")
+    result = service.all(str(tmp_path), "local")
+
+    assert result["num_deleted"] == 3
+    assert [d.page_content for d in service.collection().vectorstore.docs.values()] == ["rewritten"]
+    assert {d.page_content for d in service.collection("tmf_S1").vectorstore.docs.values()} == {"content", "of", "a"}
+    assert {d.metadata.get("collection") for d in service.collection("tmf_S1").vectorstore.docs.values()} == {"tmf_S1"}
+
+
+class SlowIndexService:
+    def all(self, source, storage_type, incremental=False, chunking="recursive", progress=None, cancel_event=None, collection=None, study_id=None):
+        progress["files_listed"] = 1
+        if source == "wait":
+            while not cancel_event.wait(0.01):
+                pass
+            raise pipeline.IngestCancelled()
+        return {"num_added": 1}
+
+
+def test_snapshot_status_follows_the_record_manager(tmp_path, monkeypatch):
+    (tmp_path / "src").mkdir()
+    write_pdfs(tmp_path / "src", monkeypatch, ["a"])
+    service = make_index_service()
+    service.all(str(tmp_path / "src"), "local")
+    service.snapshots = snapshotUtil.SnapshotExporter("sqlite://", str(tmp_path / "snapshots"))
+    # The dummy collection's record manager lives in its own in-memory database
+    service.snapshots.engine = service.collection().record_manager.engine
+    service.collection_namespace = lambda name: name
+    with service.snapshots.engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE langchain_pg_collection (uuid TEXT, name TEXT)"))
+        conn.execute(sqlalchemy.text("INSERT INTO langchain_pg_collection VALUES ('1', 'vector')"))
+
+    # Reading the status of a missing collection must not create it
+    with pytest.raises(snapshotUtil.CollectionNotFound):
+        service.snapshot_status("typo")
+    assert "typo" not in service.collections
+
+    status = service.snapshot_status()
+    assert status["exists"] is False and status["stale"] is True
+
+    (tmp_path / "snapshots" / "vector").mkdir(parents=True)
+    (tmp_path / "snapshots" / "vector" / "manifest.json").write_text(json.dumps({"format": 1, "version": status["current_version"]}))
+    assert service.snapshot_status()["stale"] is False
+
+    # Every full run re-stamps the records, so the exported snapshot falls behind
+    time.sleep(0.01)
+    service.all(str(tmp_path / "src"), "local")
+    assert service.snapshot_status()["stale"] is True
+
+
+def test_job_manager_runs_and_cancels_jobs():
+    manager = jobs.JobManager(SlowIndexService())
+
+    done = manager.submit("docs", "local")
+    done.future.result(timeout=5)
+    assert done.to_dict()["status"] == "completed"
+    assert done.to_dict()["progress"] == {"files_listed": 1}
+    assert done.result == {"num_added": 1}
+
+    running = manager.submit("wait", "local")
+    while running.status != "running":
+        time.sleep(0.01)
+    manager.cancel(running.id)
+    running.future.result(timeout=5)
+    assert running.status == "cancelled"
+
+    # Cancelled after the queue handed it to a worker but before it started
+    queued = jobs.IndexJob("docs", "local")
+    queued.cancel_event.set()
+    manager._run(queued)
+    assert queued.status == "cancelled"
+    assert queued.finished and queued.finished_on is not None
+
+
+class CountingEmbeddings:
+    model = "dummy"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_embedding_stage_serves_repeated_chunks_from_cache(tmp_path):
+    cache = embeddingCacheUtil.EmbeddingCache(f"sqlite:///{tmp_path / 'cache.db'}")
+    cache.create_schema()
+    model = CountingEmbeddings()
+    stage = embedding.EmbeddingStage(model, cache, batch_size=2, concurrency=2)
+
+    stats = {}
+    vectors = stage.embed(["cover page", "sop header", "cover page", "body"], stats)
+    assert vectors == [[10.0, 1.0], [10.0, 1.0], [10.0, 1.0], [4.0, 1.0]]
+    assert sorted(text for call in model.calls for text in call) == ["body", "cover page", "sop header"]
+
+    model.calls.clear()
+    assert stage.embed(["sop header", "cover page"], stats) == [[10.0, 1.0], [10.0, 1.0]]
+    assert model.calls == []
+    assert stats == {"embedding_cache_hits": 2, "embedding_cache_misses": 4}
+    assert cache.stats()["hit_rate"] == pytest.approx(2 / 6)
+
+
+def test_full_index_keeps_chunks_of_files_that_fail_to_download(tmp_path, monkeypatch):
+    write_pdfs(tmp_path, monkeypatch, ["a", "b"])
+    service = make_index_service()
+    service.all(str(tmp_path), "local")
+
+    def fetch(self, file_path):
+        if file_path.endswith("b.pdf"):
+            raise OSError("connection reset")
+        return file_path
+
+    monkeypatch.setattr(indexing.LocalStorage, "fetch", fetch)
+    result = service.all(str(tmp_path), "local")
+
+    assert result["num_deleted"] == 0
+    assert result["failed_files"] == [{"file": str(tmp_path / "b.pdf"), "error": "connection reset"}]
+    assert len(service.collection().vectorstore.docs) == 6
+
+
+def test_s3_fetch_retries_into_private_temp_directory():
+    storage = storageS3Util.S3Storage("bucket", region_name="eu-west-2", retry_backoff=0)
+    # Nothing on disk until the first object is fetched
+    assert storage.temp_directory is None
+    storage.close()
+    attempts = []
+
+    def download_file(bucket, key, local_path):
+        attempts.append(local_path)
+        if len(attempts) < 3:
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "GetObject")
+        open(local_path, "w").close()
+
+    storage.s3.download_file = download_file
+    local_path = storage.fetch("tmf/study/doc.pdf")
+
+    assert len(attempts) == 3
+    assert local_path.startswith(storage.temp_directory)
+    assert storage.source_id("tmf/study/doc.pdf") == "/tmp/s3_temp/tmf/study/doc.pdf"
+
+    storage.close()
+    assert not os.path.exists(storage.temp_directory)
+
+
+def test_s3_in_memory_mode_parses_bodies_without_writing_files():
+    storage = storageS3Util.S3Storage("bucket", region_name="eu-west-2", in_memory=True)
+
+    class Body:
+        def iter_chunks(self, chunk_size):
+            yield make_pdf("TMF filing SOP")
+
+    storage.s3.get_object = lambda Bucket, Key: {"Body": Body()}
+    storage.s3.download_file = None
+    ingest = pipeline.IngestPipeline(DummyListing(storage, ["tmf/sop.pdf"]), DummySplitter())
+
+    chunks = list(ingest)
+
+    assert [c.page_content for c in chunks] == ["TMF", "filing", "SOP"]
+    assert chunks[0].metadata == {"source": "/tmp/s3_temp/tmf/sop.pdf", "page": 0}
+    assert not os.path.exists(storage.temp_directory)
+
+
+def test_section_splitter_keeps_headings_with_their_sections():
+    text = "STANDARD OPERATING PROCEDURE\n1. Purpose\nDescribes TMF filing.\n2. Responsibilities\n" + "The CRA files. " * 20
+    chunks = chunking.SectionSplitter(chunk_size=120, chunk_overlap=0).split_text(text)
+
+    assert chunks[0] == "STANDARD OPERATING PROCEDURE\n1. Purpose\nDescribes TMF filing."
+    assert len(chunks) > 2
+    assert all(c.startswith("2. Responsibilities\n") and len(c) <= 120 for c in chunks[1:])
+
+
+def test_section_splitter_keeps_numbered_lists_inside_their_section():
+    text = (
+        "3. Procedure\n1. Collect the signed ICF\n2. File it in the TMF within 5 days.\n3 Subjects enrolled\n12 March 2024\n"
+        "4.1 Archiving\nClose-out documents are archived."
+    )
+    chunks = chunking.SectionSplitter(chunk_size=1024, chunk_overlap=0).split_text(text)
+
+    assert chunks == [
+        "3. Procedure\n1. Collect the signed ICF\n2. File it in the TMF within 5 days.\n3 Subjects enrolled\n12 March 2024",
+        "4.1 Archiving\nClose-out documents are archived.",
+    ]
+
+
+def test_chunking_benchmark_reports_sizes_and_hit_rate():
+    pages = [
+        Document(page_content="1. Purpose\nTMF filing procedure.", metadata={"source": "/docs/sop-1.pdf", "page": 0}),
+        Document(page_content="1. Scope\nSite monitoring visits.", metadata={"source": "/docs/sop-2.pdf", "page": 0}),
+    ]
+    questions = [
+        {"question": "How is the TMF filed?", "answer": "TMF filing procedure"},
+        {"question": "Monitoring visits", "source": "sop-2.pdf", "page": 0},
+    ]
+
+    report = benchmark_chunking.benchmark(pages, "page", questions, k=1)
+
+    assert report["chunks"] == 2
+    assert report["size_max"] == len(pages[0].page_content)
+    assert report["hit_rate"] == 1.0
+    with pytest.raises(ValueError):
+        chunking.get_text_splitter("semantic")
+
+
+class RecordingConnection:
+    # Answers the catalogue queries of ANNIndexManager and records every statement
+    def __init__(self, typmod, exists=True):
+        self.typmod = typmod
+        self.exists = exists
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "to_regclass" in sql:
+            value = self.exists
+        elif "atttypmod" in sql:
+            value = self.typmod
+        else:
+            value = None
+        return type("Result", (), {"scalar": lambda self: value, "scalars": lambda self: self, "all": lambda self: [3]})()
+
+
+def test_ann_rebuild_swaps_indexes_in_one_transaction():
+    manager = annIndexUtil.ANNIndexManager("sqlite://")
+    conn = RecordingConnection(typmod=3)
+    manager.engine = type("Engine", (), {"connect": lambda self: conn})()
+
+    result = manager.create("hnsw", m=16, ef_construction=64, rebuild=True)
+
+    name = "langchain_pg_embedding_embedding_hnsw_idx"
+    assert result["created"] is True and result["dimensions"] == 3
+    assert conn.statements[2:] == [
+        f"DROP INDEX CONCURRENTLY IF EXISTS {name}_new",
+        f"CREATE INDEX CONCURRENTLY {name}_new ON langchain_pg_embedding USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+        "BEGIN",
+        "SET LOCAL lock_timeout = '5s'",
+        f"DROP INDEX IF EXISTS {name}",
+        f"ALTER INDEX {name}_new RENAME TO {name}",
+        "COMMIT",
+    ]
+
+    # An unsized column is only rewritten on request
+    conn = RecordingConnection(typmod=-1, exists=False)
+    with pytest.raises(ValueError):
+        manager.create("hnsw")
+    assert not any("ALTER TABLE" in sql for sql in conn.statements)
+
+    manager.create("hnsw", pin_dimensions=True)
+    assert "ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector(3)" in conn.statements